@@ -1 +1,3 @@
-from .db_connection import *
\ No newline at end of file
+from .db_connection import *
+from .db_connection_pool import *
+from .data_version import *
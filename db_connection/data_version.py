@@ -0,0 +1,31 @@
+import time
+from threading import Lock
+from .db_connection_pool import DBConnectionPool, PoolTimeout
+
+class DataVersion:
+    def __init__(self, db_pool: DBConnectionPool, check_interval: float = 5.0):
+        self.db_pool = db_pool
+        # how stale the version may get before data_version is read again
+        self.check_interval = check_interval
+        self.version = None
+        self.checked_at = 0.0
+        self.lock = Lock()
+
+    def get(self) -> int:
+        # at most one query per check_interval no matter how many requests ask; nobody waits for it,
+        # while it runs or while the pool is exhausted everyone goes on with the last known version
+        if time.monotonic() - self.checked_at >= self.check_interval and self.lock.acquire(blocking=False):
+            try:
+                try:
+                    with self.db_pool.connection(wait=False) as db_connection:
+                        version = db_connection.get_data_version()
+                except PoolTimeout as e:
+                    print(f"Failed to check the data version: {e}")
+                    version = None
+                # keep the last known version if the read failed
+                if version is not None:
+                    self.version = version
+                self.checked_at = time.monotonic()
+            finally:
+                self.lock.release()
+        return self.version
@@ -1,274 +1,384 @@
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
+from array import array
+from datetime import date
+from decimal import Decimal, InvalidOperation
+import base64
 import json
+import math
+
+# game_info key -> (dimension table, id column, name column)
+DIMENSION_TABLES = {
+    'genres': ('genres', 'genre_id', 'genre_name'),
+    'tags': ('tags', 'tag_id', 'tag_name'),
+    'publishers': ('publishers', 'publisher_id', 'publisher_name'),
+    'developers': ('developers', 'developer_id', 'developer_name')
+}
+
+# game_info key -> (link table, dimension id column)
+GAME_LINK_TABLES = {
+    'genres': ('game_genres', 'genre_id'),
+    'tags': ('game_tags', 'tag_id'),
+    'publishers': ('game_publishers', 'publisher_id'),
+    'developers': ('game_developers', 'developer_id')
+}
+
+# columns search_games can be sorted (and paginated) by, relevance needs a query
+SEARCH_SORT_COLUMNS = ('score', 'last_price', 'release_date', 'title', 'total_reviews', 'positive_reviews', 'steam_id',
+                       'relevance')
+
+# game_search name arrays search results can be counted by
+SEARCH_FACETS = ('genres', 'tags', 'developers', 'publishers')
+
+
+def encode_search_cursor(sort: str, sort_direction: str, game_info: dict) -> str:
+    # opaque token holding the sort key of the last row of a page
+    cursor = [sort, sort_direction.upper(), game_info[sort], game_info['steam_id']]
+    return base64.urlsafe_b64encode(json.dumps(cursor, default=str).encode()).decode()
+
+
+def decode_search_cursor(token: str, sort: str, sort_direction: str) -> tuple:
+    try:
+        cursor_sort, cursor_direction, value, steam_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Malformed cursor")
+    if cursor_sort != sort or cursor_direction != sort_direction.upper():
+        raise ValueError("Cursor was issued for a different sort order")
+    if not _is_number(steam_id) or not isinstance(steam_id, int) or not -2 ** 31 <= steam_id < 2 ** 31:
+        raise ValueError("Malformed cursor")
+    if not _is_search_sort_value(sort, value):
+        raise ValueError("Malformed cursor")
+    return value, steam_id
+
+
+# largest last_price game_search can hold, as NUMERIC(10, 2)
+MAX_LAST_PRICE = Decimal('99999999.99')
+
+
+def _is_number(value) -> bool:
+    try:
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+    except OverflowError:
+        # ints too large for a float
+        return False
+
+
+def _is_search_sort_value(sort: str, value) -> bool:
+    # value as encode_search_cursor writes it for this sort column, anything else would fail in SQL
+    if value is None:
+        return True
+    if sort == 'title':
+        return isinstance(value, str)
+    if sort == 'release_date':
+        try:
+            date.fromisoformat(value)
+        except (TypeError, ValueError):
+            return False
+        return True
+    if sort == 'last_price':
+        # NUMERIC is read as Decimal, which the cursor holds as a string
+        if not isinstance(value, str) and not _is_number(value):
+            return False
+        try:
+            return abs(Decimal(str(value))) <= MAX_LAST_PRICE
+        except InvalidOperation:
+            return False
+    return _is_number(value)
+
+
+# date_trunc units get_games_prices can bucket price history by
+PRICE_BUCKETS = ('day', 'week', 'month')
+
 
 class DBConnection:
-    def __init__(self, host: str, port: int, db_name: str, user: str, password: str):
+    def __init__(self, host: str, port: int, db_name: str, user: str, password: str, conn=None):
         self.db_name = db_name
         self.user = user
         self.password = password
         self.host = host
         self.port = port
-        self.conn = psycopg2.connect(dbname=self.db_name, user=self.user, password=self.password, host=self.host, port=self.port)
-        
-        self.translation_data = {
-            'genres': self.get_genres(),
-            'tags': self.get_tags(),
-            'publishers': self.get_publishers(),
-            'developers': self.get_developers()
-        }
-        
-        self.game_data = {
-            'genres': self.get_game_genres(),
-            'tags': self.get_game_tags(),
-            'publishers': self.get_game_publishers(),
-            'developers': self.get_game_developers()
-        }
+        # an existing connection (e.g. checked out of DBConnectionPool) is used as is
+        self.conn = conn if conn is not None else psycopg2.connect(dbname=self.db_name, user=self.user, password=self.password, host=self.host, port=self.port)
+
+        self._translation_data = None
+        self._game_data = None
+        self._last_prices = None
+
+    @property
+    def translation_data(self) -> dict:
+        # dimension name -> id maps used only by the crawler writer, loaded on first use
+        if self._translation_data is None:
+            self._translation_data = {
+                'genres': self.get_genres(),
+                'tags': self.get_tags(),
+                'publishers': self.get_publishers(),
+                'developers': self.get_developers()
+            }
+        return self._translation_data
+
+    @property
+    def game_data(self) -> dict:
+        # link table state used only by the crawler writer, loaded on first use;
+        # game_id -> sorted array('i') of dimension ids per link table
+        if self._game_data is None:
+            self._game_data = {
+                'genres': self.get_game_genres(),
+                'tags': self.get_game_tags(),
+                'publishers': self.get_game_publishers(),
+                'developers': self.get_game_developers()
+            }
+        return self._game_data
+
+    @property
+    def last_prices(self) -> dict:
+        # game_id -> (price_wo_discount, price_w_discount) from current_prices,
+        # loaded on first use and kept up to date by the writer
+        if self._last_prices is None:
+            self._last_prices = self.get_last_prices()
+        return self._last_prices
+
 
+    def get_game_info(self, steam_id: int) -> dict:
+        games_info = self.get_games_info([steam_id])
+        return games_info.get(steam_id)
 
-    def get_game_info(self, steam_id: int) -> list[dict]:
+    def get_games_info(self, steam_ids: list[int]) -> dict:
+        # steam_id -> game info for all games in one query, None for unknown steam ids
         cursor = self.conn.cursor()
         try:
             query = sql.SQL("""
                 SELECT 
-                    g.steam_id,
-                    g.title, 
-                    g.link,
-                    g.available, 
-                    g.release_date, 
-                    g.supports_win, 
-                    g.supports_linux, 
-                    g.supports_mac, 
-                    g.positive_reviews, 
-                    g.total_reviews,
-                    array_agg(DISTINCT gnr.genre_name) AS genres,
-                    array_agg(DISTINCT tg.tag_name) AS tags,
-                    array_agg(DISTINCT dev.developer_name) AS developers,
-                    array_agg(DISTINCT pub.publisher_name) AS publishers,
-                    ph.price_w_discount AS last_price
-                FROM games g
-                LEFT JOIN game_genres gg ON g.game_id = gg.game_id
-                LEFT JOIN genres gnr ON gg.genre_id = gnr.genre_id
-                LEFT JOIN game_tags gt ON g.game_id = gt.game_id
-                LEFT JOIN tags tg ON gt.tag_id = tg.tag_id
-                LEFT JOIN game_developers gd ON g.game_id = gd.game_id
-                LEFT JOIN developers dev ON gd.developer_id = dev.developer_id
-                LEFT JOIN game_publishers gp ON g.game_id = gp.game_id
-                LEFT JOIN publishers pub ON gp.publisher_id = pub.publisher_id
-                LEFT JOIN LATERAL (
-                    SELECT ph1.price_w_discount, ph1.date_time
-                    FROM price_history ph1
-                    WHERE ph1.game_id = g.game_id
-                    ORDER BY ph1.date_time DESC
-                    LIMIT 1
-                ) ph ON true
-                WHERE g.steam_id = %s
-                GROUP BY 
-                    g.game_id, 
-                    g.title, 
-                    g.available, 
-                    g.release_date, 
-                    g.supports_win, 
-                    g.supports_linux, 
-                    g.supports_mac, 
-                    g.positive_reviews, 
-                    g.total_reviews, 
-                    ph.price_w_discount;
+                    gs.steam_id,
+                    gs.title, 
+                    gs.link,
+                    gs.available, 
+                    gs.release_date, 
+                    gs.supports_win, 
+                    gs.supports_linux, 
+                    gs.supports_mac, 
+                    gs.positive_reviews, 
+                    gs.total_reviews,
+                    gs.genres,
+                    gs.tags,
+                    gs.developers,
+                    gs.publishers,
+                    gs.last_price
+                FROM game_search gs
+                WHERE gs.steam_id = ANY(%s);
             """)
             
             # Executing the query
-            cursor.execute(query, (steam_id,))
+            cursor.execute(query, (list(steam_ids),))
             
             # Fetching all results
-            result = cursor.fetchone()
-            if result is None:
-                return None
+            results = cursor.fetchall()
             
             # Getting column names for better readability
             colnames = [desc[0] for desc in cursor.description]
             
-            # Converting the results to a list of dictionaries
-            games_info = dict(zip(colnames, result))
+            # Converting the results to a dictionary of dictionaries
+            games_info = {steam_id: None for steam_id in steam_ids}
+            for result in results:
+                game_info = dict(zip(colnames, result))
+                games_info[game_info['steam_id']] = game_info
 
             return games_info
         
         except Exception as e:
             print(f"SQL Error on get_games_info: {e}")
+            raise
         
         finally:
             cursor.close()
     
-    def get_game_prices(self, game_id: int) -> dict:
+    def get_game_prices(self, game_id: int, bucket: str = None, start=None, end=None) -> dict:
+        games_prices = self.get_games_prices([game_id], bucket=bucket, start=start, end=end)
+        return games_prices.get(game_id)
+
+    def get_games_prices(self, game_ids: list[int], bucket: str = None, start=None, end=None) -> dict:
+        # game_id -> price history as column lists, for all games in one query;
+        # bucket folds rows into min/max/last price per day, week or month, start is inclusive and end exclusive
+        if bucket is not None and bucket not in PRICE_BUCKETS:
+            raise ValueError(f"Unknown price bucket {bucket}")
         cursor = self.conn.cursor()
         try:
-            query = sql.SQL("""
-                SELECT
+            if bucket is None:
+                columns = sql.SQL("""
+                    game_id,
                     price_wo_discount,
                     price_w_discount,
                     date_time
-                FROM price_history
-                WHERE game_id = %s
-                ORDER BY date_time;
-            """)
-            
-            # Executing the query
-            cursor.execute(query, (game_id,))
-            
-            # Fetching all results
+                """)
+                group_clause = sql.SQL("")
+                params = []
+            else:
+                # GROUP BY and ORDER BY positions, date_time would name the input column there
+                columns = sql.SQL("""
+                    game_id,
+                    (array_agg(price_wo_discount ORDER BY date_time DESC))[1] AS price_wo_discount,
+                    (array_agg(price_w_discount ORDER BY date_time DESC))[1] AS price_w_discount,
+                    date_trunc(%s, date_time) AS date_time,
+                    MIN(price_w_discount) AS min_price,
+                    MAX(price_w_discount) AS max_price
+                """)
+                group_clause = sql.SQL("GROUP BY 1, 4")
+                params = [bucket]
+
+            filters = ["game_id = ANY(%s)"]
+            params.append(list(game_ids))
+            if start is not None:
+                filters.append("date_time >= %s")
+                params.append(start)
+            if end is not None:
+                filters.append("date_time < %s")
+                params.append(end)
+
+            query = sql.SQL("SELECT {columns} FROM price_history WHERE {filters} {group_clause} ORDER BY 1, 4").format(
+                columns=columns,
+                filters=sql.SQL(" AND ".join(filters)),
+                group_clause=group_clause
+            )
+            cursor.execute(query, params)
             results = cursor.fetchall()
-            
-            # Getting column names for better readability
-            colnames = [desc[0] for desc in cursor.description]
-            
-            # Converting the results to a list of dictionaries
-            dict_results = {colname: [] for colname in colnames}
-            for row in results:
-                for i, colname in enumerate(colnames):
-                    dict_results[colname].append(row[i])
-            
 
-            return dict_results
-        
+            colnames = [desc[0] for desc in cursor.description][1:]
+            games_prices = {game_id: {colname: [] for colname in colnames} for game_id in game_ids}
+            for game_id, *row in results:
+                for colname, value in zip(colnames, row):
+                    games_prices[game_id][colname].append(value)
+            return games_prices
         except Exception as e:
-            print(f"SQL Error on get_game_prices: {e}")
-        
+            print(f"SQL Error on get_games_prices: {e}")
+            raise
         finally:
             cursor.close()
-    
+
+    def _search_filters(self, query: str = None, min_price: int = None,
+                        max_price: int = None, min_year: int = None, max_year: int = None,
+                        genres: list[str] = None, tags: list[str] = None, publishers: list[str] = None, developers: list[str] = None,
+                        score: int = None) -> tuple[list[str], list]:
+        # Filters
+        filters = []
+        params = []
+
+        if query:
+            filters.append("gs.title ILIKE %s")
+            params.append(f"%{query}%")
+
+        if min_price is not None:
+            filters.append("gs.last_price >= %s")
+            params.append(min_price)
+        if max_price is not None:
+            filters.append("gs.last_price <= %s")
+            params.append(max_price)
+        # years as release_date ranges so the release_date index applies
+        if min_year is not None:
+            filters.append("gs.release_date >= make_date(%s, 1, 1)")
+            params.append(min_year)
+        if max_year is not None:
+            filters.append("gs.release_date < make_date(%s + 1, 1, 1)")
+            params.append(max_year)
+        if score is not None:
+            filters.append("gs.score >= %s AND gs.total_reviews > 10")
+            params.append(score)
+
+        # genres, tags, developers, publishers match if any of the game's names matches any pattern
+        for column, names in (("genres", genres), ("tags", tags), ("developers", developers), ("publishers", publishers)):
+            if names:
+                filters.append(f"EXISTS (SELECT 1 FROM unnest(gs.{column}) AS name WHERE name ILIKE ANY(%s))")
+                params.append(names)
+        return filters, params
+
+    def _search_query(self, query: str = None, min_price: int = None,
+                      max_price: int = None, min_year: int = None, max_year: int = None,
+                      genres: list[str] = None, tags: list[str] = None, publishers: list[str] = None, developers: list[str] = None,
+                      score: int = None, sort: str = 'score', sort_direction: str = 'DESC',
+                      limit: int = None, after: tuple = None) -> tuple:
+        # after is the (sort value, steam_id) of the last row of the previous page
+        if sort not in SEARCH_SORT_COLUMNS:
+            raise ValueError(f"Unknown sort column {sort}")
+        if sort == 'relevance' and not query:
+            raise ValueError("Sorting by relevance requires a query")
+        sort_direction = sort_direction.upper()
+        if sort_direction not in ('ASC', 'DESC'):
+            raise ValueError(f"Unknown sort direction {sort_direction}")
+        # Base query
+        base_query = sql.SQL("""
+            SELECT 
+                gs.steam_id,
+                gs.title, 
+                gs.link,
+                gs.available, 
+                gs.release_date, 
+                gs.supports_win, 
+                gs.supports_linux, 
+                gs.supports_mac, 
+                gs.positive_reviews, 
+                gs.total_reviews,
+                gs.score,
+                gs.genres,
+                gs.tags,
+                gs.developers,
+                gs.publishers,
+                gs.last_price
+                {relevance}
+            FROM game_search gs
+        """).format(
+            relevance=sql.SQL(", word_similarity(%s, gs.title)::float AS relevance") if query else sql.SQL("")
+        )
+        base_params = [query] if query else []
+
+        filters, params = self._search_filters(query=query, min_price=min_price, max_price=max_price, min_year=min_year,
+                                               max_year=max_year, genres=genres, tags=tags, publishers=publishers,
+                                               developers=developers, score=score)
+
+        def where(conditions: list[str]) -> sql.SQL:
+            return sql.SQL("WHERE " + " AND ".join(conditions) if conditions else "")
+
+        # rows with a NULL sort value come last in both directions
+        order_clause = sql.SQL("""
+            ORDER BY {sort} {sort_direction} NULLS LAST, steam_id {sort_direction}
+            LIMIT %s
+        """).format(
+            sort=sql.Identifier(sort),
+            sort_direction=sql.SQL(sort_direction)
+        )
+
+        # keyset pagination, after is the sort key of the last row already returned
+        if sort == 'relevance':
+            sort_column, sort_params = "word_similarity(%s, gs.title)::float", [query]
+        else:
+            sort_column, sort_params = f"gs.{sort}", []
+        operator = "<" if sort_direction == 'DESC' else ">"
+        after_value, after_steam_id = after if after is not None else (None, None)
+        if after is None:
+            final_query = base_query + where(filters) + order_clause
+            params = base_params + params + [limit]
+        elif after_value is None:
+            final_query = base_query + where(filters + [f"{sort_column} IS NULL AND gs.steam_id {operator} %s"]) + order_clause
+            params = base_params + params + sort_params + [after_steam_id, limit]
+        else:
+            # the rest of the non-NULL keys, then the NULL ones; kept as two branches so both can
+            # walk the sort index instead of filtering every row before the cursor
+            final_query = (sql.SQL("(") + base_query + where(filters + [f"({sort_column}, gs.steam_id) {operator} (%s, %s)"]) + order_clause
+                           + sql.SQL(") UNION ALL (") + base_query + where(filters + [f"{sort_column} IS NULL"]) + order_clause
+                           + sql.SQL(")") + order_clause)
+            params = (base_params + params + sort_params + [after_value, after_steam_id, limit]
+                      + base_params + params + sort_params + [limit, limit])
+        return final_query, params
 
     def search_games(self, query: str = None, min_price: int = None,
                  max_price: int = None, min_year: int = None, max_year: int = None,
                  genres: list[str] = None, tags: list[str] = None, publishers: list[str] = None, developers: list[str] = None,
-                 score: int = None, sort: str = 'score', sort_direction: str = 'DESC') -> list[dict]:
+                 score: int = None, sort: str = 'score', sort_direction: str = 'DESC',
+                 limit: int = None, after: tuple = None) -> list[dict]:
+        final_query, params = self._search_query(query=query, min_price=min_price, max_price=max_price, min_year=min_year,
+                                                 max_year=max_year, genres=genres, tags=tags, publishers=publishers,
+                                                 developers=developers, score=score, sort=sort,
+                                                 sort_direction=sort_direction, limit=limit, after=after)
         cursor = self.conn.cursor()
         try:
-            # Base query
-            base_query = sql.SQL("""
-                SELECT 
-                    g.steam_id,
-                    g.title, 
-                    g.link,
-                    g.available, 
-                    g.release_date, 
-                    g.supports_win, 
-                    g.supports_linux, 
-                    g.supports_mac, 
-                    g.positive_reviews, 
-                    g.total_reviews,
-                    g.positive_reviews::float / g.total_reviews * 100 AS score,
-                    array_agg(DISTINCT gnr.genre_name) AS genres,
-                    array_agg(DISTINCT tg.tag_name) AS tags,
-                    array_agg(DISTINCT dev.developer_name) AS developers,
-                    array_agg(DISTINCT pub.publisher_name) AS publishers,
-                    ph.price_w_discount AS last_price
-                FROM games g
-                LEFT JOIN game_genres gg ON g.game_id = gg.game_id
-                LEFT JOIN genres gnr ON gg.genre_id = gnr.genre_id
-                LEFT JOIN game_tags gt ON g.game_id = gt.game_id
-                LEFT JOIN tags tg ON gt.tag_id = tg.tag_id
-                LEFT JOIN game_developers gd ON g.game_id = gd.game_id
-                LEFT JOIN developers dev ON gd.developer_id = dev.developer_id
-                LEFT JOIN game_publishers gp ON g.game_id = gp.game_id
-                LEFT JOIN publishers pub ON gp.publisher_id = pub.publisher_id
-                LEFT JOIN LATERAL (
-                    SELECT ph1.price_w_discount, ph1.date_time
-                    FROM price_history ph1
-                    WHERE ph1.game_id = g.game_id
-                    ORDER BY ph1.date_time DESC
-                    LIMIT 1
-                ) ph ON true
-            """)
-
-            # Filters
-            filters = []
-            params = []
-
-            if query:
-                filters.append("g.title ILIKE %s")
-                params.append(f"%{query}%")
-
-            if min_price is not None:
-                filters.append("ph.price_w_discount >= %s")
-                params.append(min_price)
-            if max_price is not None:
-                filters.append("ph.price_w_discount <= %s")
-                params.append(max_price)
-            if min_year is not None:
-                filters.append("EXTRACT(YEAR FROM g.release_date) >= %s")
-                params.append(min_year)
-            if max_year is not None:
-                filters.append("EXTRACT(YEAR FROM g.release_date) <= %s")
-                params.append(max_year)
-            if score is not None:
-                filters.append("g.positive_reviews::float / g.total_reviews * 100 >= %s AND g.total_reviews > 10")
-                params.append(score)
-
-            # Subqueries for genres, tags, developers, publishers
-            if genres:
-                genre_ids_query = """
-                    SELECT gg.game_id
-                    FROM game_genres gg
-                    JOIN genres gnr ON gg.genre_id = gnr.genre_id
-                    WHERE gnr.genre_name ILIKE ANY(%s)
-                    GROUP BY gg.game_id
-                """
-                filters.append("g.game_id IN (" + genre_ids_query + ")")
-                params.append(genres)
-            
-            if tags:
-                tag_ids_query = """
-                    SELECT gt.game_id
-                    FROM game_tags gt
-                    JOIN tags tg ON gt.tag_id = tg.tag_id
-                    WHERE tg.tag_name ILIKE ANY(%s)
-                    GROUP BY gt.game_id
-                """
-                filters.append("g.game_id IN (" + tag_ids_query + ")")
-                params.append(tags)
-            
-            if developers:
-                developer_ids_query = """
-                    SELECT gd.game_id
-                    FROM game_developers gd
-                    JOIN developers dev ON gd.developer_id = dev.developer_id
-                    WHERE dev.developer_name ILIKE ANY(%s)
-                    GROUP BY gd.game_id
-                """
-                filters.append("g.game_id IN (" + developer_ids_query + ")")
-                params.append(developers)
-            
-            if publishers:
-                publisher_ids_query = """
-                    SELECT gp.game_id
-                    FROM game_publishers gp
-                    JOIN publishers pub ON gp.publisher_id = pub.publisher_id
-                    WHERE pub.publisher_name ILIKE ANY(%s)
-                    GROUP BY gp.game_id
-                """
-                filters.append("g.game_id IN (" + publisher_ids_query + ")")
-                params.append(publishers)
-
-            where_clause = "WHERE " + " AND ".join(filters) if filters else ""
-
-            # Adding sort column and direction to the query
-            final_query = base_query + sql.SQL(where_clause) + sql.SQL("""
-                GROUP BY 
-                    g.game_id, 
-                    g.title, 
-                    g.available, 
-                    g.release_date, 
-                    g.supports_win, 
-                    g.supports_linux, 
-                    g.supports_mac, 
-                    g.positive_reviews, 
-                    g.total_reviews, 
-                    ph.price_w_discount
-                ORDER BY {sort} {sort_direction};
-            """).format(
-                sort=sql.Identifier(sort),
-                sort_direction=sql.SQL(sort_direction.upper())
-            )
-
             cursor.execute(final_query, params)
             results = cursor.fetchall()
 
@@ -277,11 +387,156 @@ class DBConnection:
             return games_info
         except Exception as e:
             print(f"SQL Error on search_games: {e}")
-            return []
+            # an empty result would be served (and cached) by the API as if nothing matched
+            raise
+        finally:
+            cursor.close()
+
+    def iter_search_games(self, query: str = None, min_price: int = None,
+                          max_price: int = None, min_year: int = None, max_year: int = None,
+                          genres: list[str] = None, tags: list[str] = None, publishers: list[str] = None, developers: list[str] = None,
+                          score: int = None, sort: str = 'score', sort_direction: str = 'DESC',
+                          limit: int = None, after: tuple = None, chunk_size: int = 1000):
+        # same rows as search_games, read through a server-side cursor chunk_size rows at a time
+        # so memory stays flat however many games match
+        final_query, params = self._search_query(query=query, min_price=min_price, max_price=max_price, min_year=min_year,
+                                                 max_year=max_year, genres=genres, tags=tags, publishers=publishers,
+                                                 developers=developers, score=score, sort=sort,
+                                                 sort_direction=sort_direction, limit=limit, after=after)
+        cursor = self.conn.cursor(name="iter_search_games")
+        cursor.itersize = chunk_size
+        try:
+            cursor.execute(final_query, params)
+            colnames = None
+            for result in cursor:
+                # a named cursor only has a description once rows were fetched
+                if colnames is None:
+                    colnames = [desc[0] for desc in cursor.description]
+                yield dict(zip(colnames, result))
+        except Exception as e:
+            print(f"SQL Error on iter_search_games: {e}")
+            # the response is already partly written, it has to break off rather than end like a complete export
+            raise
         finally:
             cursor.close()
 
 
+    def get_search_facets(self, facets: list[str], facet_limit: int = 10, **filters) -> dict:
+        # facet -> [{name, count}] of the facet_limit most common names among all games matching filters,
+        # counted in one pass over the filtered rows; ties are ordered by name in code point order
+        if any(facet not in SEARCH_FACETS for facet in facets):
+            raise ValueError(f"Unknown facet in {facets}")
+        if not facets:
+            return {}
+        cursor = self.conn.cursor()
+        try:
+            filter_conditions, params = self._search_filters(**filters)
+            counts = sql.SQL(" UNION ALL ").join(
+                sql.SQL("SELECT {facet} AS facet, name, COUNT(*) AS games FROM matches, unnest(matches.{column}) AS name GROUP BY name").format(
+                    facet=sql.Literal(facet),
+                    column=sql.Identifier(facet)
+                ) for facet in facets
+            )
+            query = sql.SQL("""
+                WITH matches AS MATERIALIZED (
+                    SELECT {columns} FROM game_search gs {where}
+                ),
+                counts AS ({counts}),
+                ranked AS (
+                    SELECT facet, name, games,
+                           row_number() OVER (PARTITION BY facet ORDER BY games DESC, name COLLATE "C") AS position
+                    FROM counts
+                )
+                SELECT facet, name, games FROM ranked WHERE position <= %s ORDER BY facet, position
+            """).format(
+                columns=sql.SQL(", ").join(sql.SQL("gs.{}").format(sql.Identifier(facet)) for facet in facets),
+                where=sql.SQL("WHERE " + " AND ".join(filter_conditions) if filter_conditions else ""),
+                counts=counts
+            )
+            cursor.execute(query, params + [facet_limit])
+            results = cursor.fetchall()
+
+            search_facets = {facet: [] for facet in facets}
+            for facet, name, games in results:
+                search_facets[facet].append({'name': name, 'count': games})
+            return search_facets
+        except Exception as e:
+            print(f"SQL Error on get_search_facets: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    def get_search_catalogue(self) -> tuple[list[str], list[tuple]]:
+        # every game_search row with the columns search_games returns, for the in-memory search engine;
+        # title_rank orders titles by the database collation so title sorts match search_games
+        cursor = self.conn.cursor()
+        try:
+            query = sql.SQL("""
+                SELECT 
+                    gs.steam_id,
+                    gs.title, 
+                    gs.link,
+                    gs.available, 
+                    gs.release_date, 
+                    gs.supports_win, 
+                    gs.supports_linux, 
+                    gs.supports_mac, 
+                    gs.positive_reviews, 
+                    gs.total_reviews,
+                    gs.score,
+                    gs.genres,
+                    gs.tags,
+                    gs.developers,
+                    gs.publishers,
+                    gs.last_price,
+                    rank() OVER (ORDER BY gs.title) AS title_rank
+                FROM game_search gs
+            """)
+            cursor.execute(query)
+            results = cursor.fetchall()
+            colnames = [desc[0] for desc in cursor.description]
+            return colnames, results
+        except Exception as e:
+            print(f"SQL Error on get_search_catalogue: {e}")
+            return None
+        finally:
+            cursor.close()
+
+    def get_titles_by_popularity(self) -> list[tuple]:
+        # (steam_id, title) of every titled game, most reviewed first
+        cursor = self.conn.cursor()
+        try:
+            query = sql.SQL("""
+                SELECT steam_id, title
+                FROM games
+                WHERE title IS NOT NULL
+                ORDER BY total_reviews DESC NULLS LAST, steam_id
+            """)
+            cursor.execute(query)
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"SQL Error on get_titles_by_popularity: {e}")
+            return None
+        finally:
+            cursor.close()
+
+    def get_titles_relevance(self, query: str, steam_ids: list[int]) -> dict:
+        # steam_id -> relevance as search_games computes it, for results found elsewhere
+        cursor = self.conn.cursor()
+        try:
+            sql_query = sql.SQL("""
+                SELECT gs.steam_id, word_similarity(%s, gs.title)::float
+                FROM game_search gs
+                WHERE gs.steam_id = ANY(%s)
+            """)
+            cursor.execute(sql_query, (query, list(steam_ids)))
+            return dict(cursor.fetchall())
+        except Exception as e:
+            print(f"SQL Error on get_titles_relevance: {e}")
+            raise
+        finally:
+            cursor.close()
+
     def get_game_ids(self) -> list[int]:
         cursor = self.conn.cursor()
         try:
@@ -294,6 +549,33 @@ class DBConnection:
         finally:
             cursor.close()
     
+    def get_steam_ids(self) -> dict:
+        cursor = self.conn.cursor()
+        try:
+            query = sql.SQL("SELECT steam_id, game_id FROM games")
+            cursor.execute(query)
+            results = cursor.fetchall()
+            return {steam_id: game_id for steam_id, game_id in results}
+        except Exception as e:
+            print(f"SQL Error on get_steam_ids: {e}")
+            return {}
+        finally:
+            cursor.close()
+    
+    def get_last_prices(self) -> dict:
+        cursor = self.conn.cursor()
+        try:
+            query = sql.SQL("SELECT game_id, price_wo_discount, price_w_discount FROM current_prices")
+            cursor.execute(query)
+            results = cursor.fetchall()
+            return {game_id: (float(price_wo_discount), float(price_w_discount))
+                    for game_id, price_wo_discount, price_w_discount in results}
+        except Exception as e:
+            print(f"SQL Error on get_last_prices: {e}")
+            return {}
+        finally:
+            cursor.close()
+    
     def get_genres(self) -> dict:
         cursor = self.conn.cursor()
         try:
@@ -347,12 +629,12 @@ class DBConnection:
             cursor.close()
     
     def get_game_genres(self) -> dict:
-        cursor = self.conn.cursor()
+        # streamed through a server-side cursor so the full result set is never held at once
+        cursor = self.conn.cursor(name="game_genres")
         try:
-            query = sql.SQL("SELECT game_id, array_agg(genre_id) FROM game_genres GROUP BY game_id")
+            query = sql.SQL("SELECT game_id, array_agg(genre_id ORDER BY genre_id) FROM game_genres GROUP BY game_id")
             cursor.execute(query)
-            results = cursor.fetchall()
-            return {game_id: genre_ids for game_id, genre_ids in results}
+            return {game_id: array('i', genre_ids) for game_id, genre_ids in cursor}
         except Exception as e:
             print(f"SQL Error on get_game_genres: {e}")
             return {}
@@ -360,12 +642,12 @@ class DBConnection:
             cursor.close()
     
     def get_game_tags(self) -> dict:
-        cursor = self.conn.cursor()
+        # streamed through a server-side cursor so the full result set is never held at once
+        cursor = self.conn.cursor(name="game_tags")
         try:
-            query = sql.SQL("SELECT game_id, array_agg(tag_id) FROM game_tags GROUP BY game_id")
+            query = sql.SQL("SELECT game_id, array_agg(tag_id ORDER BY tag_id) FROM game_tags GROUP BY game_id")
             cursor.execute(query)
-            results = cursor.fetchall()
-            return {game_id: tag_ids for game_id, tag_ids in results}
+            return {game_id: array('i', tag_ids) for game_id, tag_ids in cursor}
         except Exception as e:
             print(f"SQL Error on get_game_tags: {e}")
             return {}
@@ -373,12 +655,12 @@ class DBConnection:
             cursor.close()
     
     def get_game_publishers(self) -> dict:
-        cursor = self.conn.cursor()
+        # streamed through a server-side cursor so the full result set is never held at once
+        cursor = self.conn.cursor(name="game_publishers")
         try:
-            query = sql.SQL("SELECT game_id, array_agg(publisher_id) FROM game_publishers GROUP BY game_id")
+            query = sql.SQL("SELECT game_id, array_agg(publisher_id ORDER BY publisher_id) FROM game_publishers GROUP BY game_id")
             cursor.execute(query)
-            results = cursor.fetchall()
-            return {game_id: publisher_ids for game_id, publisher_ids in results}
+            return {game_id: array('i', publisher_ids) for game_id, publisher_ids in cursor}
         except Exception as e:
             print(f"SQL Error on get_game_publishers: {e}")
             return {}
@@ -386,104 +668,54 @@ class DBConnection:
             cursor.close()
     
     def get_game_developers(self) -> dict:
-        cursor = self.conn.cursor()
+        # streamed through a server-side cursor so the full result set is never held at once
+        cursor = self.conn.cursor(name="game_developers")
         try:
-            query = sql.SQL("SELECT game_id, array_agg(developer_id) FROM game_developers GROUP BY game_id")
+            query = sql.SQL("SELECT game_id, array_agg(developer_id ORDER BY developer_id) FROM game_developers GROUP BY game_id")
             cursor.execute(query)
-            results = cursor.fetchall()
-            return {game_id: developer_ids for game_id, developer_ids in results}
+            return {game_id: array('i', developer_ids) for game_id, developer_ids in cursor}
         except Exception as e:
             print(f"SQL Error on get_game_developers: {e}")
             return {}
         finally:
             cursor.close()
             
-    def add_developers(self, developers: list[str]) -> None:
-        cursor = self.conn.cursor()
-        try:
-            values = [(developer,) for developer in developers]
-            query = sql.SQL("INSERT INTO developers (developer_name) VALUES {}").format(
-                sql.SQL(',').join(map(sql.Literal, values))
-            )
-            cursor.execute(query)
-            self.conn.commit()
-        except Exception as e:
-            print(f"SQL Error on add_developers: {e}")
-        finally:
-            cursor.close()
-    
-    def add_publishers(self, publishers: list[str]) -> None:
-        cursor = self.conn.cursor()
-        try:
-            values = [(publisher,) for publisher in publishers]
-            query = sql.SQL("INSERT INTO publishers (publisher_name) VALUES {}").format(
-                sql.SQL(',').join(map(sql.Literal, values))
-            )
-            cursor.execute(query)
-            self.conn.commit()
-        except Exception as e:
-            print(f"SQL Error on add_publishers: {e}")
-        finally:
-            cursor.close()
-    
-    def add_genres(self, genres: list[str]) -> None:
-        cursor = self.conn.cursor()
-        try:
-            values = [(genre,) for genre in genres]
-            query = sql.SQL("INSERT INTO genres (genre_name) VALUES {}").format(
-                sql.SQL(',').join(map(sql.Literal, values))
-            )
-            cursor.execute(query)
-            self.conn.commit()
-        except Exception as e:
-            print(f"SQL Error on add_genres: {e}")
-        finally:
-            cursor.close()
-    
-    def add_tags(self, tags: list[str]) -> None:
+    def add_dimension_names(self, key: str, names: list[str]) -> dict:
+        # inserts missing names and returns name -> id for all of them, existing ones included
+        table, id_column, name_column = DIMENSION_TABLES[key]
         cursor = self.conn.cursor()
         try:
-            values = [(tag,) for tag in tags]
-            query = sql.SQL("INSERT INTO tags (tag_name) VALUES {}").format(
-                sql.SQL(',').join(map(sql.Literal, values))
-            )
-            cursor.execute(query)
+            query = sql.SQL("""
+                INSERT INTO {table} ({name_column}) VALUES %s
+                ON CONFLICT ({name_column}) DO UPDATE SET {name_column} = EXCLUDED.{name_column}
+                RETURNING {name_column}, {id_column};
+            """).format(table=sql.Identifier(table), id_column=sql.Identifier(id_column),
+                        name_column=sql.Identifier(name_column))
+            results = execute_values(cursor, query, [(name,) for name in names], fetch=True)
             self.conn.commit()
+            return dict(results)
         except Exception as e:
-            print(f"SQL Error on add_tags: {e}")
+            self.conn.rollback()
+            print(f"SQL Error on add_dimension_names: {e}")
+            raise
         finally:
             cursor.close()
-            
+
     def update_translation_data(self, game_info: dict) -> None:
-        new_genres = list(set(game_info['genres']) - set(self.translation_data['genres']))
-        new_tags = list(set(game_info['tags']) - set(self.translation_data['tags']))
-        new_developers = list(set(game_info['developers']) - set(self.translation_data['developers']))
-        new_publishers = list(set(game_info['publishers']) - set(self.translation_data['publishers']))
-        
-        if new_genres:
-            self.add_genres(new_genres)
-        if new_tags:
-            self.add_tags(new_tags)
-        if new_developers:
-            self.add_developers(new_developers)
-        if new_publishers:
-            self.add_publishers(new_publishers)
-            
-        if new_genres or new_tags or new_developers or new_publishers:
-            new_translation_data = {
-                'genres': self.get_genres(),
-                'tags': self.get_tags(),
-                'publishers': self.get_publishers(),
-                'developers': self.get_developers()
-            }
-            if new_translation_data["genres"]:
-                self.translation_data = new_translation_data
+        self.update_translation_data_many([game_info])
+
+    def update_translation_data_many(self, games_info: list[dict]) -> None:
+        # resolves the names unknown so far with one statement per dimension
+        for key, translation in self.translation_data.items():
+            new_names = {name for game_info in games_info for name in game_info[key]} - translation.keys()
+            if new_names:
+                translation.update(self.add_dimension_names(key, sorted(new_names)))
     
     def update_game_data(self, game_id: int, game_data: dict) -> None:
-        self.game_data['genres'][game_id] = game_data['genres']
-        self.game_data['tags'][game_id] = game_data['tags']
-        self.game_data['publishers'][game_id] = game_data['publishers']
-        self.game_data['developers'][game_id] = game_data['developers']
+        self.game_data['genres'][game_id] = array('i', sorted(set(game_data['genres'])))
+        self.game_data['tags'][game_id] = array('i', sorted(set(game_data['tags'])))
+        self.game_data['publishers'][game_id] = array('i', sorted(set(game_data['publishers'])))
+        self.game_data['developers'][game_id] = array('i', sorted(set(game_data['developers'])))
     
     def _process_game_genres(self, game_id: int, old_genres: list[int], new_genres: list[int]) -> None:
         cursor = self.conn.cursor()
@@ -603,30 +835,71 @@ class DBConnection:
             cursor.close()
     
     def _process_game_price(self, game_id: int, price_wo_discount: float, price_w_discount: float) -> None:
+        if self.last_prices.get(game_id) == (price_wo_discount, price_w_discount):
+            return
         cursor = self.conn.cursor()
         try:
             query = sql.SQL("""
-                SELECT price_wo_discount, price_w_discount
-                FROM price_history
-                WHERE game_id = %s
-                ORDER BY date_time DESC
-                LIMIT 1;
+                INSERT INTO price_history (game_id, price_wo_discount, price_w_discount, date_time)
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP);
             """)
-            cursor.execute(query, (game_id,))
-            result = cursor.fetchone()
-            if result is None or float(result[0]) != price_wo_discount or float(result[1]) != price_w_discount:
-                query = sql.SQL("""
-                    INSERT INTO price_history (game_id, price_wo_discount, price_w_discount, date_time)
-                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP);
-                """)
-                cursor.execute(query, (game_id, price_wo_discount, price_w_discount))
-                self.conn.commit()
+            cursor.execute(query, (game_id, price_wo_discount, price_w_discount))
+            query = sql.SQL("""
+                INSERT INTO current_prices (game_id, price_wo_discount, price_w_discount, date_time)
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (game_id) DO UPDATE
+                SET price_wo_discount = EXCLUDED.price_wo_discount,
+                    price_w_discount = EXCLUDED.price_w_discount,
+                    date_time = EXCLUDED.date_time;
+            """)
+            cursor.execute(query, (game_id, price_wo_discount, price_w_discount))
+            self.conn.commit()
+            self.last_prices[game_id] = (price_wo_discount, price_w_discount)
         except Exception as e:
+            # an aborted transaction would fail every later statement on this connection
+            self.conn.rollback()
             print(f"SQL Error on process_game_price: {e}")
         finally:
             cursor.close()
 
 
+    def _write_prices(self, cursor, prices: list[tuple]) -> list[tuple]:
+        # appends the (game_id, price_wo_discount, price_w_discount) that changed to price_history and
+        # current_prices without committing, returns them so last_prices is only updated after the commit
+        prices = [price for price in prices if self.last_prices.get(price[0]) != (price[1], price[2])]
+        if prices:
+            query = sql.SQL("INSERT INTO price_history (game_id, price_wo_discount, price_w_discount, date_time) VALUES %s")
+            execute_values(cursor, query, prices, template="(%s, %s, %s, CURRENT_TIMESTAMP)")
+            query = sql.SQL("""
+                INSERT INTO current_prices (game_id, price_wo_discount, price_w_discount, date_time)
+                VALUES %s
+                ON CONFLICT (game_id) DO UPDATE
+                SET price_wo_discount = EXCLUDED.price_wo_discount,
+                    price_w_discount = EXCLUDED.price_w_discount,
+                    date_time = EXCLUDED.date_time;
+            """)
+            execute_values(cursor, query, prices, template="(%s, %s, %s, CURRENT_TIMESTAMP)")
+        return prices
+
+    def update_game_price(self, game_id: int, price_wo_discount: float, price_w_discount: float) -> None:
+        self.update_games_prices([(game_id, price_wo_discount, price_w_discount)])
+
+    def update_games_prices(self, prices: list[tuple]) -> None:
+        # (game_id, price_wo_discount, price_w_discount) per game, the changed ones are written in one transaction
+        prices = list({price[0]: price for price in prices}.values())
+        cursor = self.conn.cursor()
+        try:
+            prices = self._write_prices(cursor, prices)
+            self.conn.commit()
+            for game_id, price_wo_discount, price_w_discount in prices:
+                self.last_prices[game_id] = (price_wo_discount, price_w_discount)
+        except Exception as e:
+            self.conn.rollback()
+            print(f"SQL Error on update_games_prices: {e}")
+            raise
+        finally:
+            cursor.close()
+
     def add_or_update_game_info(self, game_info: dict) -> int:
         cursor = self.conn.cursor()
         try:
@@ -670,8 +943,117 @@ class DBConnection:
         finally:
             cursor.close()
 
-    
+
+    def add_or_update_games_info(self, games_info: list[dict]) -> dict:
+        # writes games, their link rows and changed prices in one transaction, returns steam_id -> game_id
+        games_info = list({game_info["steam_id"]: game_info for game_info in games_info}.values())
+        if not games_info:
+            return {}
+        cursor = self.conn.cursor()
+        try:
+            query = sql.SQL("""
+                INSERT INTO games (steam_id, title, link, available, release_date, supports_win, supports_linux, supports_mac, positive_reviews, total_reviews)
+                VALUES %s
+                ON CONFLICT (steam_id) DO UPDATE
+                SET title = EXCLUDED.title,
+                    link = EXCLUDED.link,
+                    available = EXCLUDED.available,
+                    release_date = EXCLUDED.release_date,
+                    supports_win = EXCLUDED.supports_win,
+                    supports_linux = EXCLUDED.supports_linux,
+                    supports_mac = EXCLUDED.supports_mac,
+                    positive_reviews = EXCLUDED.positive_reviews,
+                    total_reviews = EXCLUDED.total_reviews
+                RETURNING steam_id, game_id;
+            """)
+            values = [(game_info["steam_id"], game_info["title"], game_info["link"], game_info["available"], game_info["release_date"],
+                       game_info["supports_win"], game_info["supports_linux"], game_info["supports_mac"],
+                       game_info["positive_reviews"], game_info["total_reviews"]) for game_info in games_info]
+            game_ids = dict(execute_values(cursor, query, values, fetch=True))
+
+            for key, (table, column) in GAME_LINK_TABLES.items():
+                rows_to_add = []
+                rows_to_remove = []
+                for game_info in games_info:
+                    game_id = game_ids[game_info["steam_id"]]
+                    old_ids = set(self.game_data[key].get(game_id, []))
+                    new_ids = set(game_info[key])
+                    rows_to_add.extend((game_id, id) for id in new_ids - old_ids)
+                    rows_to_remove.extend((game_id, id) for id in old_ids - new_ids)
+                if rows_to_add:
+                    query = sql.SQL("INSERT INTO {table} (game_id, {column}) VALUES %s ON CONFLICT DO NOTHING").format(
+                        table=sql.Identifier(table), column=sql.Identifier(column))
+                    execute_values(cursor, query, rows_to_add)
+                if rows_to_remove:
+                    query = sql.SQL("""
+                        DELETE FROM {table} t USING (VALUES %s) AS d(game_id, {column})
+                        WHERE t.game_id = d.game_id AND t.{column} = d.{column}
+                    """).format(table=sql.Identifier(table), column=sql.Identifier(column))
+                    execute_values(cursor, query, rows_to_remove)
+
+            prices = self._write_prices(cursor, [(game_ids[game_info["steam_id"]], game_info["price_wo_discount"],
+                                                  game_info["price_w_discount"]) for game_info in games_info])
+
+            self.conn.commit()
+            for game_info in games_info:
+                self.update_game_data(game_ids[game_info["steam_id"]], game_info)
+            for game_id, price_wo_discount, price_w_discount in prices:
+                self.last_prices[game_id] = (price_wo_discount, price_w_discount)
+            return game_ids
+
+        except Exception as e:
+            self.conn.rollback()
+            print(f"SQL Error on add_or_update_games_info: {e}")
+            # the whole batch is lost, the crawl must not go on to publish it as complete
+            raise
+        finally:
+            cursor.close()
+
+    def refresh_search_view(self) -> bool:
+        # False when game_search still holds the previous crawl
+        cursor = self.conn.cursor()
+        try:
+            query = sql.SQL("REFRESH MATERIALIZED VIEW CONCURRENTLY game_search;")
+            cursor.execute(query)
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            print(f"SQL Error on refresh_search_view: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def get_data_version(self) -> int:
+        cursor = self.conn.cursor()
+        try:
+            query = sql.SQL("SELECT version FROM data_version")
+            cursor.execute(query)
+            version, = cursor.fetchone()
+            return version
+        except Exception as e:
+            print(f"SQL Error on get_data_version: {e}")
+            return None
+        finally:
+            cursor.close()
+
+    def bump_data_version(self) -> None:
+        # tells API processes that cached responses and in-memory catalogue data are stale
+        cursor = self.conn.cursor()
+        try:
+            query = sql.SQL("UPDATE data_version SET version = version + 1, updated_at = NOW()")
+            cursor.execute(query)
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"SQL Error on bump_data_version: {e}")
+        finally:
+            cursor.close()
+
     def set_unavailable_games(self, game_ids: list[int]) -> None:
+        # IN () is a syntax error, and nothing went missing anyway
+        if not game_ids:
+            return
         cursor = self.conn.cursor()
         try:
             query = sql.SQL("""
@@ -682,6 +1064,7 @@ class DBConnection:
             cursor.execute(query, (tuple(game_ids),))
             self.conn.commit()
         except Exception as e:
+            self.conn.rollback()
             print(f"SQL Error on set_unavailable_games: {e}")
         finally:
             cursor.close()
@@ -0,0 +1,65 @@
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import contextmanager
+from threading import Semaphore
+from .db_connection import DBConnection
+
+class PoolTimeout(Exception):
+    pass
+
+
+class DBConnectionPool:
+    def __init__(self, host: str, port: int, db_name: str, user: str, password: str,
+                 min_connections: int = 1, max_connections: int = 10, checkout_timeout: float | None = None):
+        self.db_name = db_name
+        self.user = user
+        self.password = password
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.pool = ThreadedConnectionPool(min_connections, max_connections, dbname=self.db_name, user=self.user,
+                                           password=self.password, host=self.host, port=self.port)
+        # ThreadedConnectionPool raises when exhausted, callers wait here for a free connection instead,
+        # at most checkout_timeout seconds (None waits for as long as it takes)
+        self.available = Semaphore(max_connections)
+        self.checkout_timeout = checkout_timeout
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _getconn(self):
+        # drops connections the server closed (restart, idle timeout) and opens fresh ones
+        for _ in range(self.max_connections + 1):
+            conn = self.pool.getconn()
+            if self._is_healthy(conn):
+                return conn
+            self.pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("Failed to get a healthy database connection")
+
+    @contextmanager
+    def connection(self, wait: bool = True):
+        # wait=False raises PoolTimeout right away when every connection is taken
+        if not self.available.acquire(blocking=wait, timeout=self.checkout_timeout if wait else None):
+            raise PoolTimeout(f"No database connection became free within {self.checkout_timeout}s" if wait
+                              else "Every database connection is taken")
+        try:
+            conn = self._getconn()
+            try:
+                yield DBConnection(self.host, self.port, self.db_name, self.user, self.password, conn=conn)
+            finally:
+                # putconn rolls back whatever transaction the request left open or aborted
+                self.pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self.available.release()
+
+    def close(self) -> None:
+        self.pool.closeall()
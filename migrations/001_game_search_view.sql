@@ -0,0 +1,57 @@
+-- One row per game with its dimension names and current price, read by the API instead of
+-- joining all link tables per request. Refreshed by run_crawler.py at the end of each crawl.
+CREATE MATERIALIZED VIEW game_search AS
+SELECT
+    g.game_id,
+    g.steam_id,
+    g.title,
+    g.link,
+    g.available,
+    g.release_date,
+    g.supports_win,
+    g.supports_linux,
+    g.supports_mac,
+    g.positive_reviews,
+    g.total_reviews,
+    g.positive_reviews::float / NULLIF(g.total_reviews, 0) * 100 AS score,
+    ARRAY(
+        SELECT gnr.genre_name
+        FROM game_genres gg
+        JOIN genres gnr ON gg.genre_id = gnr.genre_id
+        WHERE gg.game_id = g.game_id
+        ORDER BY gnr.genre_name
+    ) AS genres,
+    ARRAY(
+        SELECT tg.tag_name
+        FROM game_tags gt
+        JOIN tags tg ON gt.tag_id = tg.tag_id
+        WHERE gt.game_id = g.game_id
+        ORDER BY tg.tag_name
+    ) AS tags,
+    ARRAY(
+        SELECT dev.developer_name
+        FROM game_developers gd
+        JOIN developers dev ON gd.developer_id = dev.developer_id
+        WHERE gd.game_id = g.game_id
+        ORDER BY dev.developer_name
+    ) AS developers,
+    ARRAY(
+        SELECT pub.publisher_name
+        FROM game_publishers gp
+        JOIN publishers pub ON gp.publisher_id = pub.publisher_id
+        WHERE gp.game_id = g.game_id
+        ORDER BY pub.publisher_name
+    ) AS publishers,
+    ph.price_w_discount AS last_price
+FROM games g
+LEFT JOIN LATERAL (
+    SELECT ph1.price_w_discount
+    FROM price_history ph1
+    WHERE ph1.game_id = g.game_id
+    ORDER BY ph1.date_time DESC
+    LIMIT 1
+) ph ON true;
+
+-- unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX idx_game_search_game_id ON game_search(game_id);
+CREATE UNIQUE INDEX idx_game_search_steam_id ON game_search(steam_id);
@@ -0,0 +1,15 @@
+-- Sort indexes for keyset pagination in search_games, one per sort column and direction
+-- (ORDER BY <column> <direction> NULLS LAST, steam_id <direction>)
+CREATE INDEX idx_game_search_score_asc ON game_search(score, steam_id);
+CREATE INDEX idx_game_search_score_desc ON game_search(score DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_last_price_asc ON game_search(last_price, steam_id);
+CREATE INDEX idx_game_search_last_price_desc ON game_search(last_price DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_release_date_asc ON game_search(release_date, steam_id);
+CREATE INDEX idx_game_search_release_date_desc ON game_search(release_date DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_title_asc ON game_search(title, steam_id);
+CREATE INDEX idx_game_search_title_desc ON game_search(title DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_total_reviews_asc ON game_search(total_reviews, steam_id);
+CREATE INDEX idx_game_search_total_reviews_desc ON game_search(total_reviews DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_positive_reviews_asc ON game_search(positive_reviews, steam_id);
+CREATE INDEX idx_game_search_positive_reviews_desc ON game_search(positive_reviews DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_steam_id_desc ON game_search(steam_id DESC NULLS LAST);
@@ -0,0 +1,4 @@
+-- Trigram index so the title ILIKE '%...%' filter and relevance ranking in search_games
+-- no longer scan every row of game_search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX idx_game_search_title_trgm ON game_search USING gin (title gin_trgm_ops);
@@ -0,0 +1,7 @@
+-- Single row bumped by run_crawler.py at the end of each crawl, API caches are dropped when it changes
+CREATE TABLE data_version (
+    version INT NOT NULL,
+    updated_at TIMESTAMP NOT NULL
+);
+
+INSERT INTO data_version (version, updated_at) VALUES (1, NOW());
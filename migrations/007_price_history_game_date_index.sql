@@ -0,0 +1,3 @@
+-- Price history is read per game and date range, game_id alone is covered by the new index
+CREATE INDEX idx_price_history_game_id_date_time ON price_history(game_id, date_time);
+DROP INDEX idx_game_id;
@@ -0,0 +1,4 @@
+-- Searches read game_search, whose own score and release_date indexes serve the sorts and year
+-- filters; these two on games were never used by any query
+DROP INDEX IF EXISTS idx_score;
+DROP INDEX IF EXISTS idx_release_date;
@@ -0,0 +1,3 @@
+-- Price filters and sorts read game_search.last_price, nothing looks current_prices up by price;
+-- the index only cost an update per changed price
+DROP INDEX IF EXISTS idx_current_prices_price_w_discount;
@@ -0,0 +1 @@
+from .response_cache import *
\ No newline at end of file
@@ -1,6 +1,7 @@
 from steam_crawler import SteamCrawler
 from db_connection import DBConnection
 from datetime import datetime
+import argparse
 import asyncio
 
 def steam_date_to_postgres_date(date_str):
@@ -48,28 +49,80 @@ def sanitize_data(data: dict, translation_data: dict) -> dict:
     return data
 
 
-async def main():
+def write_games(db_connection: DBConnection, games_info: list[dict]) -> dict:
+    db_connection.update_translation_data_many(games_info)
+    games_info = [sanitize_data(game_info, db_connection.translation_data) for game_info in games_info]
+    return db_connection.add_or_update_games_info(games_info)
+
+
+async def stop_crawler(crawler_task: asyncio.Task) -> None:
+    # a failed write ends the run, the crawler must not keep fetching into a queue nobody reads
+    if not crawler_task.done():
+        crawler_task.cancel()
+        await asyncio.gather(crawler_task, return_exceptions=True)
+
+
+async def crawl_games(steam_crawler: SteamCrawler, db_connection: DBConnection, batch_size: int = 50) -> None:
     loop = asyncio.get_event_loop()
-    steam_crawler = SteamCrawler()
-    db_connection = DBConnection("localhost", 5432, "steam", "twinkboy42", "twinkboy42")
-    game_ids = set(db_connection.get_game_ids())
-    processed_game_ids = set()
-    loop.create_task(steam_crawler.run())
-    while steam_crawler.games_processed < steam_crawler.total_games:
-        if steam_crawler.datastream:
-            data = steam_crawler.datastream.pop(0)
-            db_connection.update_translation_data(data)
-            data = sanitize_data(data, db_connection.translation_data)
-            game_id = db_connection.add_or_update_game_info(data)
-            db_connection.update_game_data(game_id, data)
-            processed_game_ids.add(game_id)
-        else:
-            print(steam_crawler.games_processed, steam_crawler.total_games)
-            await asyncio.sleep(1)
-    unavailable_game_ids = list(game_ids - processed_game_ids)
+    steam_ids = db_connection.get_steam_ids()
+    batch = []
+    crawler_task = loop.create_task(steam_crawler.run())
+    try:
+        async for data in steam_crawler.stream():
+            batch.append(data)
+            if len(batch) >= batch_size:
+                write_games(db_connection, batch)
+                batch = []
+                print(steam_crawler.games_processed, steam_crawler.total_games)
+        write_games(db_connection, batch)
+        await crawler_task
+    finally:
+        await stop_crawler(crawler_task)
+    # a game whose page failed this time is still listed, only games gone from the listing are unavailable
+    unavailable_game_ids = [game_id for steam_id, game_id in steam_ids.items()
+                            if steam_id not in steam_crawler.listed_steam_ids]
     db_connection.set_unavailable_games(unavailable_game_ids)
+
+
+async def crawl_prices(steam_crawler: SteamCrawler, db_connection: DBConnection, batch_size: int = 50) -> None:
+    # only games already in the database get price updates, new games wait for a full crawl
+    loop = asyncio.get_event_loop()
+    steam_ids = db_connection.get_steam_ids()
+    batch = []
+    crawler_task = loop.create_task(steam_crawler.run())
+    try:
+        async for data in steam_crawler.stream():
+            game_id = steam_ids.get(data['steam_id'])
+            if game_id is not None:
+                batch.append((game_id, data['price_wo_discount'], data['price_w_discount']))
+            if len(batch) >= batch_size:
+                db_connection.update_games_prices(batch)
+                batch = []
+        db_connection.update_games_prices(batch)
+        await crawler_task
+    finally:
+        await stop_crawler(crawler_task)
+
+
+async def main(prices_only: bool = False):
+    steam_crawler = SteamCrawler(prices_only=prices_only)
+    db_connection = DBConnection("localhost", 5432, "steam", "twinkboy42", "twinkboy42")
+    if prices_only:
+        await crawl_prices(steam_crawler, db_connection)
+    else:
+        await crawl_games(steam_crawler, db_connection)
+    refreshed = db_connection.refresh_search_view()
+    # API caches keep the previous crawl until game_search actually holds the new one
+    if refreshed:
+        db_connection.bump_data_version()
     db_connection.conn.close()
+    if not refreshed:
+        raise SystemExit("Failed to refresh game_search, the API still serves the previous crawl")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prices-only", action="store_true",
+                        help="refresh prices of known games from the search results only, skipping game pages")
+    args = parser.parse_args()
+    asyncio.run(main(args.prices_only))
@@ -1,10 +1,95 @@
-from flask import Flask, jsonify, request
-from db_connection import DBConnection
+from flask import Flask, Response, jsonify, request
+from db_connection import DBConnectionPool, PoolTimeout, DataVersion, SEARCH_SORT_COLUMNS, SEARCH_FACETS, PRICE_BUCKETS, encode_search_cursor, decode_search_cursor
+from response_cache import ResponseCache
+from search_engine import SearchEngine, SuggestIndex
+from functools import wraps
+from hashlib import sha1
+from datetime import datetime
+from threading import BoundedSemaphore
+import os
 
 app = Flask(__name__)
-db_connection = DBConnection("localhost", 5432, "steam", "twinkboy42", "twinkboy42")
+# one pool per process; under gunicorn size DB_POOL_MAX to at least the worker's thread count
+db_pool = DBConnectionPool("localhost", 5432, "steam", "twinkboy42", "twinkboy42",
+                           min_connections=int(os.environ.get("DB_POOL_MIN", 1)),
+                           max_connections=int(os.environ.get("DB_POOL_MAX", 10)),
+                           checkout_timeout=float(os.environ.get("DB_POOL_TIMEOUT", 5)))
+# streamed exports hold a connection for as long as the client takes to download them,
+# so they may only ever take part of the pool
+stream_max_concurrent = min(int(os.environ.get("STREAM_MAX_CONCURRENT", db_pool.max_connections // 2)),
+                            db_pool.max_connections - 1)
+stream_slots = BoundedSemaphore(stream_max_concurrent) if stream_max_concurrent > 0 else None
+search_default_limit = int(os.environ.get("SEARCH_DEFAULT_LIMIT", 50))
+search_max_limit = int(os.environ.get("SEARCH_MAX_LIMIT", 100))
+facet_max_limit = int(os.environ.get("FACET_MAX_LIMIT", 100))
+suggest_default_limit = int(os.environ.get("SUGGEST_DEFAULT_LIMIT", 10))
+suggest_max_limit = int(os.environ.get("SUGGEST_MAX_LIMIT", 50))
+prices_max_batch = int(os.environ.get("PRICES_MAX_BATCH", 100))
+games_max_batch = int(os.environ.get("GAMES_MAX_BATCH", 100))
+# catalogue data only changes when run_crawler.py bumps the data version
+data_version = DataVersion(db_pool, check_interval=float(os.environ.get("DATA_VERSION_CHECK_INTERVAL", 5)))
+response_cache = ResponseCache(max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", 1024)),
+                               ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 300)))
+# SEARCH_ENGINE=memory answers searches from a NumPy copy of game_search, reloaded on data version bumps
+search_engine = SearchEngine(db_pool, data_version) if os.environ.get("SEARCH_ENGINE") == "memory" else None
+# title prefix index behind /api/v1/suggest, rebuilt on data version bumps
+suggest_index = SuggestIndex(db_pool, data_version)
+
+
+def cached(view):
+    # serves successful responses from response_cache, with an ETag clients can revalidate with
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = data_version.get()
+        response_cache.sync_version(version)
+        # empty parameters fall back to defaults and repeated ones match regardless of order
+        key = (request.path, tuple(sorted((name, value) for name, value in request.args.items(multi=True) if value)))
+        entry = response_cache.get(key)
+        if entry is None:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            entry = (body, sha1(body).hexdigest())
+            response_cache.set(key, entry, version)
+        body, etag = entry
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # 304 without a body when If-None-Match still matches
+        return response.make_conditional(request)
+    return wrapper
+
+
+def stream_search(response_format: str, limit: int = None, chunk_rows: int = 500, **search_args):
+    # runs after the view returned, so it checks out its own connection for as long as the body is written
+    with db_pool.connection() as db_connection:
+        games = db_connection.iter_search_games(limit=limit + 1 if limit is not None and response_format == 'json' else limit,
+                                                **search_args)
+        try:
+            chunk = [] if response_format == 'ndjson' else ['{"games": [']
+            last_game_info, next_cursor = None, None
+            for i, game_info in enumerate(games):
+                # the extra row only tells whether there is a next page
+                if i == limit:
+                    next_cursor = encode_search_cursor(search_args['sort'], search_args['sort_direction'], last_game_info)
+                    break
+                if response_format == 'ndjson':
+                    chunk.append(app.json.dumps(game_info) + "\n")
+                else:
+                    chunk.append(("," if i else "") + app.json.dumps(game_info))
+                last_game_info = game_info
+                if len(chunk) >= chunk_rows:
+                    yield "".join(chunk)
+                    chunk = []
+            if response_format == 'json':
+                chunk.append('], "next_cursor": ' + app.json.dumps(next_cursor) + '}')
+            yield "".join(chunk)
+        finally:
+            games.close()
+
 
 @app.route('/api/v1/search', methods=['GET'])
+@cached
 def search():
     query = request.args.get('query')
     min_price = request.args.get('min_price', type=float)
@@ -19,25 +104,160 @@ def search():
     score = request.args.get('score', type=int)
     sort = request.args.get('sort') if request.args.get('sort') else 'score'
     sort_direction = request.args.get('sort_direction') if request.args.get('sort_direction') else 'DESC'
+    response_format = request.args.get('format', 'json')
+    # streamed responses are exports: any limit goes and no limit means every match
+    stream = request.args.get('stream', 'false').lower() in ('1', 'true') or response_format == 'ndjson'
+    if stream:
+        limit = request.args.get('limit', type=int)
+    else:
+        limit = min(request.args.get('limit', search_default_limit, type=int), search_max_limit)
+    cursor = request.args.get('cursor')
+    facets = list(dict.fromkeys(facet for facet in request.args.get('facets', '').split(',') if facet))
+    facet_limit = request.args.get('facet_limit', 10, type=int)
 
-    res = db_connection.search_games(query=query, score=score, genres=genres, tags=tags,
-                                     developers=developers, publishers=publishers, min_price=min_price,
-                                     max_price=max_price, min_year=min_year, max_year=max_year,
-                                     sort=sort, sort_direction=sort_direction)
-    return jsonify(res)
+    if sort not in SEARCH_SORT_COLUMNS:
+        return jsonify({"error": f"sort must be one of {', '.join(SEARCH_SORT_COLUMNS)}"}), 400
+    if sort == 'relevance' and not query:
+        return jsonify({"error": "sort by relevance requires a query"}), 400
+    if sort_direction.upper() not in ('ASC', 'DESC'):
+        return jsonify({"error": "sort_direction must be ASC or DESC"}), 400
+    if response_format not in ('json', 'ndjson'):
+        return jsonify({"error": "format must be json or ndjson"}), 400
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    # make_date has no year 0 and dates end with year 9999
+    if any(year is not None and not 1 <= year <= 9999 for year in (min_year, max_year)):
+        return jsonify({"error": "min_year and max_year must be between 1 and 9999"}), 400
+    if any(facet not in SEARCH_FACETS for facet in facets):
+        return jsonify({"error": f"facets must be among {', '.join(SEARCH_FACETS)}"}), 400
+    if facets and stream:
+        return jsonify({"error": "facets are not available for streamed responses"}), 400
+    if not 1 <= facet_limit <= facet_max_limit:
+        return jsonify({"error": f"facet_limit must be between 1 and {facet_max_limit}"}), 400
+    try:
+        after = decode_search_cursor(cursor, sort, sort_direction) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filters = dict(query=query, score=score, genres=genres, tags=tags, developers=developers, publishers=publishers,
+                   min_price=min_price, max_price=max_price, min_year=min_year, max_year=max_year)
+    if stream:
+        if stream_slots is None or not stream_slots.acquire(blocking=False):
+            return jsonify({"error": "too many streamed responses in progress, retry later"}), 503
+        games = stream_search(response_format, sort=sort, sort_direction=sort_direction, limit=limit, after=after, **filters)
+        response = Response(games, mimetype='application/x-ndjson' if response_format == 'ndjson' else 'application/json')
+        # the slot is held until the server is done with the body, however it ends
+        response.call_on_close(stream_slots.release)
+        return response
+
+    # one extra row tells whether there is a next page
+    search_args = dict(sort=sort, sort_direction=sort_direction, limit=limit + 1, after=after, **filters)
+    res = search_engine.search_games(**search_args) if search_engine is not None else None
+    if res is None:
+        with db_pool.connection() as db_connection:
+            res = db_connection.search_games(**search_args)
+    next_cursor = encode_search_cursor(sort, sort_direction, res[limit - 1]) if len(res) > limit else None
+    if not facets:
+        return jsonify({"games": res[:limit], "next_cursor": next_cursor})
+
+    # counted over every game matching the filters, not only this page
+    search_facets = search_engine.search_facets(facets, facet_limit, **filters) if search_engine is not None else None
+    if search_facets is None:
+        with db_pool.connection() as db_connection:
+            search_facets = db_connection.get_search_facets(facets, facet_limit, **filters)
+    return jsonify({"games": res[:limit], "next_cursor": next_cursor, "facets": search_facets})
+
+
+def batch_ids_arg(max_batch: int) -> list[int]:
+    # ids=1,2,3 without duplicates, raises ValueError on bad input
+    try:
+        ids = list(dict.fromkeys(int(id) for id in request.args.get('ids', '').split(',') if id))
+    except ValueError:
+        raise ValueError("ids must be comma separated integers")
+    if not ids:
+        raise ValueError("ids is required")
+    if len(ids) > max_batch:
+        raise ValueError(f"at most {max_batch} ids per request")
+    return ids
+
+
+def price_history_args() -> tuple:
+    # bucket, start and end shared by the prices endpoints, raises ValueError on bad input
+    bucket = request.args.get('bucket') or None
+    if bucket is not None and bucket not in PRICE_BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(PRICE_BUCKETS)}")
+    try:
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        raise ValueError("start and end must be ISO 8601 dates")
+    return bucket, start, end
 
 
-@app.route('/api/v1/games/<id>', methods=['GET'])
+@app.route('/api/v1/games/<int:id>', methods=['GET'])
+@cached
 def get_game(id):
-    res = db_connection.get_game_info(id)
+    with db_pool.connection() as db_connection:
+        res = db_connection.get_game_info(id)
     return jsonify(res)
 
 
-@app.route('/api/v1/prices/<id>', methods=['GET'])
+@app.route('/api/v1/games', methods=['GET'])
+@cached
+def get_games():
+    try:
+        ids = batch_ids_arg(games_max_batch)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with db_pool.connection() as db_connection:
+        res = db_connection.get_games_info(ids)
+    return jsonify(res)
+
+
+@app.route('/api/v1/prices/<int:id>', methods=['GET'])
+@cached
 def get_prices(id):
-    res = db_connection.get_game_prices(id)
+    try:
+        bucket, start, end = price_history_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with db_pool.connection() as db_connection:
+        res = db_connection.get_game_prices(id, bucket=bucket, start=start, end=end)
+    return jsonify(res)
+
+
+@app.route('/api/v1/prices', methods=['GET'])
+@cached
+def get_prices_batch():
+    try:
+        ids = batch_ids_arg(prices_max_batch)
+        bucket, start, end = price_history_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with db_pool.connection() as db_connection:
+        res = db_connection.get_games_prices(ids, bucket=bucket, start=start, end=end)
     return jsonify(res)
 
 
+# not behind response_cache, every keystroke is a new key and the index answers faster than a cache lookup
+@app.route('/api/v1/suggest', methods=['GET'])
+def suggest():
+    query = request.args.get('query', '')
+    limit = min(request.args.get('limit', suggest_default_limit, type=int), suggest_max_limit)
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    return jsonify(suggest_index.suggest(query, limit))
+
+
+@app.errorhandler(PoolTimeout)
+def pool_timeout(e):
+    return jsonify({"error": "the database is busy, retry later"}), 503
+
+
+@app.route('/api/v1/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8000)
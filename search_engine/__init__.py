@@ -0,0 +1,3 @@
+from .versioned_snapshot import *
+from .search_engine import *
+from .suggest_index import *
\ No newline at end of file
@@ -0,0 +1,268 @@
+import re
+from datetime import date
+import numpy as np
+from db_connection import SEARCH_SORT_COLUMNS, SEARCH_FACETS
+from .versioned_snapshot import VersionedSnapshot
+
+# sort columns answered from the catalogue, relevance needs pg_trgm and stays in SQL
+ENGINE_SORT_COLUMNS = tuple(column for column in SEARCH_SORT_COLUMNS if column != 'relevance')
+
+# title queries and dimension patterns whose matches a catalogue keeps
+MATCH_CACHE_SIZE = 1024
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def like_to_regex(pattern: str) -> re.Pattern:
+    # ILIKE pattern -> equivalent case-insensitive regex, backslash escapes the next character
+    regex, escaped = [], False
+    for char in pattern:
+        if escaped:
+            regex.append(re.escape(char))
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '%':
+            regex.append('.*')
+        elif char == '_':
+            regex.append('.')
+        else:
+            regex.append(re.escape(char))
+    return re.compile(''.join(regex), re.IGNORECASE | re.DOTALL)
+
+
+def years_representable(min_year: int, max_year: int) -> bool:
+    # date() covers years 1 to 9999 and max_year is compared against the start of the following year
+    return (min_year is None or 1 <= min_year <= 9999) and (max_year is None or 0 <= max_year <= 9998)
+
+
+def date_to_days(value) -> float:
+    return float(value.toordinal() - EPOCH_ORDINAL) if value is not None else np.nan
+
+
+class Catalogue:
+    # immutable snapshot of game_search as column arrays, replaced as a whole on reload
+    def __init__(self, version: int, colnames: list[str], rows: list[tuple]):
+        self.version = version
+        self.rows = rows
+        # output columns are exactly the ones search_games returns, title_rank comes last
+        self.colnames = colnames[:-1]
+        columns = dict(zip(colnames, zip(*rows))) if rows else {colname: () for colname in colnames}
+
+        def numeric(values) -> np.ndarray:
+            return np.array([float(value) if value is not None else np.nan for value in values], dtype=np.float64)
+
+        self.steam_id = numeric(columns['steam_id'])
+        self.titles = [title.lower() if title is not None else None for title in columns['title']]
+        self.raw_titles = list(columns['title'])
+        # sort keys, NaN where the database value is NULL
+        self.sort_keys = {
+            'score': numeric(columns['score']),
+            'last_price': numeric(columns['last_price']),
+            'release_date': np.array([date_to_days(value) for value in columns['release_date']], dtype=np.float64),
+            'title': np.array([float(rank) if title is not None else np.nan
+                               for rank, title in zip(columns['title_rank'], columns['title'])], dtype=np.float64),
+            'total_reviews': numeric(columns['total_reviews']),
+            'positive_reviews': numeric(columns['positive_reviews']),
+            'steam_id': self.steam_id
+        }
+        self.title_ranks = {title: float(rank) for rank, title in zip(columns['title_rank'], columns['title'])
+                            if title is not None}
+
+        # dimension -> (names, row index array per name)
+        self.dimensions = {}
+        for dimension in SEARCH_FACETS:
+            name_rows = {}
+            for row, names in enumerate(columns[dimension]):
+                for name in names or ():
+                    name_rows.setdefault(name, []).append(row)
+            self.dimensions[dimension] = (list(name_rows), [np.array(rows, dtype=np.int32) for rows in name_rows.values()])
+
+        # dimension -> (name number, row) per game/name link, to count names over any set of rows at once
+        self.links = {}
+        for dimension, (names, name_rows) in self.dimensions.items():
+            lengths = [len(rows) for rows in name_rows]
+            self.links[dimension] = (np.repeat(np.arange(len(names), dtype=np.int32), lengths),
+                                     np.concatenate(name_rows) if name_rows else np.zeros(0, dtype=np.int32))
+
+        # (sort, descending) -> every row in result order, built on first use
+        self.orders = {}
+        # title queries and (dimension, pattern) filters repeat across pages and sorts, so their matches are kept
+        self.title_masks = {}
+        self.pattern_rows = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def title_mask(self, query: str) -> np.ndarray:
+        # title ILIKE '%query%'
+        mask = self.title_masks.get(query)
+        if mask is None:
+            if not any(char in query for char in '%_\\'):
+                needle = query.lower()
+                mask = np.fromiter((title is not None and needle in title for title in self.titles), dtype=bool,
+                                   count=len(self.titles))
+            else:
+                regex = like_to_regex(f"%{query}%")
+                mask = np.fromiter((title is not None and regex.fullmatch(title) is not None for title in self.raw_titles),
+                                   dtype=bool, count=len(self.raw_titles))
+            if len(self.title_masks) >= MATCH_CACHE_SIZE:
+                self.title_masks.clear()
+            self.title_masks[query] = mask
+        return mask
+
+    def dimension_mask(self, dimension: str, patterns: list[str]) -> np.ndarray:
+        # games with any name matching any ILIKE pattern
+        mask = np.zeros(len(self.rows), dtype=bool)
+        for pattern in patterns:
+            rows = self.pattern_rows.get((dimension, pattern))
+            if rows is None:
+                regex = like_to_regex(pattern)
+                names, name_rows = self.dimensions[dimension]
+                matches = [rows for name, rows in zip(names, name_rows) if regex.fullmatch(name)]
+                rows = np.unique(np.concatenate(matches)) if matches else np.zeros(0, dtype=np.int32)
+                if len(self.pattern_rows) >= MATCH_CACHE_SIZE:
+                    self.pattern_rows.clear()
+                self.pattern_rows[(dimension, pattern)] = rows
+            mask[rows] = True
+        return mask
+
+    def filter_mask(self, query: str = None, min_price: float = None, max_price: float = None,
+                    min_year: int = None, max_year: int = None, genres: list[str] = None, tags: list[str] = None,
+                    publishers: list[str] = None, developers: list[str] = None, score: int = None) -> np.ndarray:
+        # same filters as DBConnection._search_query, comparisons with NaN (NULL) are false like in SQL
+        mask = np.ones(len(self.rows), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            if query:
+                mask &= self.title_mask(query)
+            if min_price is not None:
+                mask &= self.sort_keys['last_price'] >= float(min_price)
+            if max_price is not None:
+                mask &= self.sort_keys['last_price'] <= float(max_price)
+            if min_year is not None:
+                mask &= self.sort_keys['release_date'] >= date_to_days(date(min_year, 1, 1))
+            if max_year is not None:
+                mask &= self.sort_keys['release_date'] < date_to_days(date(max_year + 1, 1, 1))
+            if score is not None:
+                mask &= (self.sort_keys['score'] >= score) & (self.sort_keys['total_reviews'] > 10)
+        for dimension, patterns in (('genres', genres), ('tags', tags), ('developers', developers), ('publishers', publishers)):
+            if patterns:
+                mask &= self.dimension_mask(dimension, patterns)
+        return mask
+
+    def sort_value(self, sort: str, value) -> float:
+        # cursor value as issued by encode_search_cursor -> sort key, None if it cannot be placed
+        if value is None:
+            return np.nan
+        try:
+            if sort == 'title':
+                return self.title_ranks.get(value)
+            if sort == 'release_date':
+                return date_to_days(date.fromisoformat(value))
+            return float(value)
+        except (ValueError, TypeError):
+            return None
+
+    def order(self, sort: str, descending: bool) -> np.ndarray:
+        # NULLs last in both directions, then the sort key, then steam_id
+        order = self.orders.get((sort, descending))
+        if order is None:
+            keys = self.sort_keys[sort]
+            nulls = np.isnan(keys)
+            keys = np.where(nulls, 0.0, keys)
+            steam_ids = self.steam_id
+            if descending:
+                keys, steam_ids = -keys, -steam_ids
+            order = np.lexsort((steam_ids, keys, nulls))
+            self.orders[(sort, descending)] = order
+        return order
+
+    def search(self, sort: str = 'score', sort_direction: str = 'DESC', limit: int = None, after: tuple = None,
+               **filters) -> list[int]:
+        # row numbers in search_games order, None if the cursor does not belong to this catalogue
+        mask = self.filter_mask(**filters)
+        keys = self.sort_keys[sort]
+        descending = sort_direction.upper() == 'DESC'
+        if after is not None:
+            after_value, after_steam_id = after
+            after_key = self.sort_value(sort, after_value)
+            if after_key is None:
+                return None
+            later = np.less if descending else np.greater
+            with np.errstate(invalid='ignore'):
+                if np.isnan(after_key):
+                    mask &= np.isnan(keys) & later(self.steam_id, after_steam_id)
+                else:
+                    mask &= (later(keys, after_key) | ((keys == after_key) & later(self.steam_id, after_steam_id))
+                             | np.isnan(keys))
+        order = self.order(sort, descending)
+        rows = order[mask[order]]
+        if limit is not None:
+            rows = rows[:limit]
+        return rows.tolist()
+
+    def facets(self, facets: list[str], facet_limit: int = 10, **filters) -> dict:
+        # same counts as DBConnection.get_search_facets, ties ordered by name in code point order
+        mask = self.filter_mask(**filters)
+        search_facets = {}
+        for facet in facets:
+            names, _ = self.dimensions[facet]
+            link_names, link_rows = self.links[facet]
+            counts = np.bincount(link_names[mask[link_rows]], minlength=len(names))
+            top = np.flatnonzero(counts)
+            if len(top) > facet_limit:
+                # everything tied with the facet_limit-th count can still make the cut by name
+                threshold = np.partition(counts[top], len(top) - facet_limit)[len(top) - facet_limit]
+                top = top[counts[top] >= threshold]
+            top = sorted(top.tolist(), key=lambda name: (-counts[name], names[name]))[:facet_limit]
+            search_facets[facet] = [{'name': names[name], 'count': int(counts[name])} for name in top]
+        return search_facets
+
+    def game_info(self, row: int) -> dict:
+        return dict(zip(self.colnames, self.rows[row]))
+
+
+class SearchEngine(VersionedSnapshot):
+    def load(self, version: int) -> Catalogue:
+        with self.db_pool.connection() as db_connection:
+            catalogue_rows = db_connection.get_search_catalogue()
+        if catalogue_rows is None:
+            return None
+        return Catalogue(version, *catalogue_rows)
+
+    def search_games(self, query: str = None, min_price: float = None,
+                     max_price: float = None, min_year: int = None, max_year: int = None,
+                     genres: list[str] = None, tags: list[str] = None, publishers: list[str] = None, developers: list[str] = None,
+                     score: int = None, sort: str = 'score', sort_direction: str = 'DESC',
+                     limit: int = None, after: tuple = None) -> list[dict]:
+        # same results as DBConnection.search_games, None when the query has to go to the database
+        if sort not in ENGINE_SORT_COLUMNS or not years_representable(min_year, max_year):
+            return None
+        catalogue = self.get()
+        if catalogue is None:
+            return None
+        rows = catalogue.search(query=query, min_price=min_price, max_price=max_price, min_year=min_year,
+                                max_year=max_year, genres=genres, tags=tags, publishers=publishers,
+                                developers=developers, score=score, sort=sort, sort_direction=sort_direction,
+                                limit=limit, after=after)
+        if rows is None:
+            return None
+        games_info = [catalogue.game_info(row) for row in rows]
+        if query and games_info:
+            # relevance is computed by pg_trgm, only for the rows returned
+            with self.db_pool.connection() as db_connection:
+                relevance = db_connection.get_titles_relevance(query, [game_info['steam_id'] for game_info in games_info])
+            for game_info in games_info:
+                game_info['relevance'] = relevance.get(game_info['steam_id'])
+        return games_info
+
+    def search_facets(self, facets: list[str], facet_limit: int = 10, **filters) -> dict:
+        # same result as DBConnection.get_search_facets, None when the catalogue is not available
+        if any(facet not in SEARCH_FACETS for facet in facets):
+            raise ValueError(f"Unknown facet in {facets}")
+        if not years_representable(filters.get('min_year'), filters.get('max_year')):
+            return None
+        catalogue = self.get()
+        if catalogue is None:
+            return None
+        return catalogue.facets(facets, facet_limit, **filters)
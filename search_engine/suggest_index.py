@@ -0,0 +1,67 @@
+import re
+from bisect import bisect_left
+import numpy as np
+from .versioned_snapshot import VersionedSnapshot
+
+# longer keys and queries are cut to this many characters
+SUGGEST_KEY_LENGTH = 48
+
+NON_WORD = re.compile(r'\W+')
+
+
+def normalize_title(title: str) -> list[str]:
+    # case-folded words, punctuation and whitespace runs act as separators
+    return NON_WORD.sub(' ', title.casefold()).split()
+
+
+class TitleIndex:
+    # sorted title suffixes starting at each word, so a query matches the start of any word of a title
+    def __init__(self, version: int, titles: list[tuple]):
+        self.version = version
+        # games are numbered by popularity, lower is more reviewed
+        self.steam_ids = [steam_id for steam_id, _ in titles]
+        self.titles = [title for _, title in titles]
+        entries = set()
+        for game, (_, title) in enumerate(titles):
+            words = normalize_title(title)
+            for start in range(len(words)):
+                entries.add((' '.join(words[start:])[:SUGGEST_KEY_LENGTH], game))
+        entries = sorted(entries)
+        self.keys = [key for key, _ in entries]
+        self.games = np.array([game for _, game in entries], dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def suggest(self, query: str, limit: int = 10) -> list[dict]:
+        prefix = ' '.join(normalize_title(query))[:SUGGEST_KEY_LENGTH]
+        if not prefix:
+            return []
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\U0010ffff', start)
+        candidates = self.games[start:end]
+        # the limit most popular distinct games are among the n lowest numbers once those hold limit distinct ones
+        n = limit
+        while True:
+            lowest = np.partition(candidates, n - 1)[:n] if n < len(candidates) else candidates
+            games = np.unique(lowest)
+            if len(games) >= limit or n >= len(candidates):
+                break
+            n *= 2
+        return [{'steam_id': self.steam_ids[game], 'title': self.titles[game]} for game in games[:limit].tolist()]
+
+
+class SuggestIndex(VersionedSnapshot):
+    def load(self, version: int) -> TitleIndex:
+        with self.db_pool.connection() as db_connection:
+            titles = db_connection.get_titles_by_popularity()
+        if titles is None:
+            return None
+        return TitleIndex(version, titles)
+
+    def suggest(self, query: str, limit: int = 10) -> list[dict]:
+        # top limit (steam_id, title) pairs by total_reviews whose title has a word starting with query
+        title_index = self.get()
+        if title_index is None:
+            return []
+        return title_index.suggest(query, limit)
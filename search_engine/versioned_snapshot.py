@@ -0,0 +1,33 @@
+from abc import ABC, abstractmethod
+from threading import Lock
+from db_connection import DBConnectionPool, DataVersion
+
+class VersionedSnapshot(ABC):
+    # keeps the snapshot load() builds from the database and rebuilds it when the crawler bumps the data version;
+    # snapshots are never modified, only replaced, so readers need no locking
+    def __init__(self, db_pool: DBConnectionPool, data_version: DataVersion):
+        self.db_pool = db_pool
+        self.data_version = data_version
+        self.snapshot = None
+        self.reload_lock = Lock()
+
+    @abstractmethod
+    def load(self, version: int):
+        # returns the new snapshot (with a version attribute), or None if it could not be built
+        ...
+
+    def get(self):
+        # the first caller after a data version bump reloads, everyone else keeps the previous snapshot meanwhile
+        snapshot = self.snapshot
+        version = self.data_version.get()
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        if self.reload_lock.acquire(blocking=snapshot is None):
+            try:
+                if self.snapshot is snapshot:
+                    new_snapshot = self.load(version)
+                    if new_snapshot is not None:
+                        self.snapshot = new_snapshot
+            finally:
+                self.reload_lock.release()
+        return self.snapshot
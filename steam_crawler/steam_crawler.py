@@ -1,58 +1,98 @@
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+from .steam_parser import DETAIL_PARSERS, get_game_urls, get_games_info_main, get_game_info_detail
+from yarl import URL
 import aiohttp
 import asyncio
 import io
 import json
 
+class FetchError(Exception):
+    pass
+
+
 class SteamCrawler:
 
-    def __init__(self):
+    def __init__(self, connection_limit: int = 100, connection_limit_per_host: int = 30,
+                 keepalive_timeout: float = 30, dns_cache_ttl: int = 300,
+                 max_requests: int = 100, max_scroll_pages: int = 4, max_game_pages: int = 50,
+                 queue_size: int = 500, parse_workers: int | None = None, detail_parser: str = 'strained',
+                 prices_only: bool = False):
+        if detail_parser not in DETAIL_PARSERS:
+            raise ValueError(f"Unknown detail parser {detail_parser}, expected one of {list(DETAIL_PARSERS)}")
         self.search_url = "https://store.steampowered.com/search/?filter=topsellers"
         self.scroll_url = "https://store.steampowered.com/search/results/?query=&start=NUM&count=50&filter=topsellers&infinite=true"
         self.agecheck_url = "https://store.steampowered.com/agecheckset/app/NUM/"
-        self.datastream = []
+        # cookies the store sets after a successful age check (born 13 January 1995)
+        self.agecheck_cookies = {"birthtime": "789955200", "lastagecheckage": "13-0-1995", "wants_mature_content": "1"}
+        self.datastream = asyncio.Queue(maxsize=queue_size)
         self.games_processed = 0
         self.total_games = 1
+        # every appid listed on a crawled scroll page, whether or not its game could be fetched
+        self.listed_steam_ids = set()
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.session = None
+        self.max_scroll_pages = max_scroll_pages
+        self.request_semaphore = asyncio.Semaphore(max_requests)
+        self.game_page_semaphore = asyncio.Semaphore(max_game_pages)
+        # None uses one parser process per core, 0 parses on the event loop
+        self.parse_workers = parse_workers
+        self.parse_executor = None
+        self.detail_parser = detail_parser
+        # only scroll pages are fetched, games carry main listing fields (title, platforms, prices)
+        self.prices_only = prices_only
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            limit_per_host=self.connection_limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    def _set_agecheck_cookies(self) -> None:
+        self.session.cookie_jar.update_cookies(self.agecheck_cookies, URL(self.agecheck_url).origin())
+
+    async def _pass_age_check(self, url: str) -> None:
+        agecheck_url = self.agecheck_url.replace("NUM", url.split('/')[-3])
+        session_id = self.session.cookie_jar.filter_cookies(URL(self.agecheck_url).origin()).get("sessionid")
+        data = {"ageDay": "13", "ageMonth": "January", "ageYear": "1995", "sessionid": session_id.value if session_id else ""}
+        async with self.request_semaphore:
+            async with self.session.post(agecheck_url, data=data) as response:
+                await response.text()
+                if response.status != 200:
+                    raise FetchError(f"Failed to fetch content from {url}, status {response.status}")
+        self._set_agecheck_cookies()
 
     async def _fetch_url_content(self, url: str) -> str:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
+        async with self.request_semaphore:
+            async with self.session.get(url) as response:
                 content = await response.text()
                 if response.status != 200:
-                    raise Exception(f"Failed to fetch content from {url}")
+                    raise FetchError(f"Failed to fetch content from {url}, status {response.status}")
                 return content
     
-    async def _fetch_game_content(self, url: str) -> str:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                content = await response.text()
-                if response.status != 200:
-                    raise Exception(f"Failed to fetch content from {url}")
-                # check if age check is required (div with class "age_gate")
-                soup = BeautifulSoup(content, 'html.parser')
-                agecheck_div = soup.find("div", {"class": "age_gate"})
-                if not agecheck_div:
-                    return content
-                agecheck_url = self.agecheck_url.replace("NUM", url.split('/')[-3])
-                session_id = session.cookie_jar.filter_cookies("https://store.steampowered.com")["sessionid"].value
-                data = {"ageDay": "13", "ageMonth": "January", "ageYear": "1995", "sessionid": session_id}
-                async with session.post(agecheck_url, data=data) as response:
-                    content = await response.text()
-                    if response.status != 200:
-                        raise Exception(f"Failed to fetch content from {url}")
-                    async with session.get(url) as response:
-                        content = await response.text()
-                        if response.status != 200:
-                            raise Exception(f"Failed to fetch content from {url}")
-                        return content
+    async def _parse(self, parser, *args):
+        if self.parse_executor is None:
+            return parser(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.parse_executor, parser, *args)
 
+    async def fetch_game_info_detail(self, url: str) -> dict | None:
+        async with self.game_page_semaphore:
+            content = await self._fetch_url_content(url)
+            game_info = await self._parse(get_game_info_detail, content, self.detail_parser)
+            if game_info is not None:
+                return game_info
+            # the age check cookies were rejected or expired, set them again
+            await self._pass_age_check(url)
+            content = await self._fetch_url_content(url)
+            return await self._parse(get_game_info_detail, content, self.detail_parser)
 
-    async def fetch_game_pages(self, urls: list[str]) -> list[str]:
-        tasks = []
-        for url in urls:
-            tasks.append(self._fetch_game_content(url))
-        return await asyncio.gather(*tasks)
-    
     async def fetch_search_page(self) -> str:
         page = await self._fetch_url_content(self.search_url)
         return page
@@ -74,104 +114,87 @@ class SteamCrawler:
         return search_page.replace("<!-- End List Items -->", scroll_page)
     
     def get_game_urls(self, page: str) -> list[str]:
-        soup = BeautifulSoup(page, 'html.parser')
-        links = soup.select("a.search_result_row")
-        return [link['href'] for link in links if 'href' in link.attrs]
+        return get_game_urls(page)
 
     def get_game_ids(self, urls: list[str]) -> list[int]:
         return [int(url.split('/')[-3]) for url in urls]
 
-    def _get_game_info_main(self, search_page: str, appid: int) -> dict:
-        soup = BeautifulSoup(search_page, 'html.parser')
-        game_info = {}
-        a_tag = soup.find('a', {'data-ds-itemkey': f'App_{appid}'})
-        title_span = a_tag.find('span', class_='title')
-        game_info['title'] = title_span.text
-        win_span = a_tag.find('span', class_='platform_img win')
-        mac_span = a_tag.find('span', class_='platform_img mac')
-        linux_span = a_tag.find('span', class_='platform_img linux')
-        game_info['supports_win'] = bool(win_span)
-        game_info['supports_mac'] = bool(mac_span)
-        game_info['supports_linux'] = bool(linux_span)
-        original_price_div = a_tag.find('div', class_='discount_original_price')
-        discount_price_div = a_tag.find('div', class_='discount_final_price')
-        if original_price_div:
-            price_wo_discount = float(original_price_div.text[:-1].replace(',', '.')) if original_price_div.text != 'Free' else 0
-            price_w_discount = float(discount_price_div.text[:-1].replace(',', '.')) if discount_price_div.text != 'Free' else 0
-            game_info['price_wo_discount'] = price_wo_discount
-            game_info['price_w_discount'] = price_w_discount
-        else:
-            price_w_discount = float(discount_price_div.text[:-1].replace(',', '.')) if discount_price_div.text != 'Free' else 0
-            game_info['price_wo_discount'] = price_w_discount
-            game_info['price_w_discount'] = price_w_discount
-        return game_info
-    
-    def _get_game_info_detail(self, page: str) -> dict:
-        soup = BeautifulSoup(page, 'html.parser')
-        game_info = {}
-        glance_block = soup.find('div', class_='glance_ctn')
-        release_date = glance_block.find('div', class_='date')
-        game_info['release_date'] = release_date.text if release_date else None
-
-        developers_list_div = glance_block.find('div', class_='dev_row')
-        developers = [developer.text for developer in developers_list_div.find_all('a')] if developers_list_div else []
-        game_info['developers'] = developers
-
-        publishers_list_div = developers_list_div.find_next('div', class_='dev_row')
-        publishers = [publisher.text for publisher in publishers_list_div.find_all('a')] if publishers_list_div else []
-        game_info['publishers'] = publishers
-
-        tags_div = glance_block.find('div', class_='glance_tags_ctn')
-        tags = [tag.text.strip() for tag in tags_div.find_all('a')] if tags_div else []
-        game_info['tags'] = tags
-
-        genres_block = soup.find('div', id='genresAndManufacturer').find('span')
-        genres = [genre.text for genre in genres_block.find_all('a')] if genres_block else []
-        game_info['genres'] = genres
-        
-        reviews_div = soup.find('div', id='reviews_filter_options')
-        if not reviews_div:
-            game_info['total_reviews'] = None
-            game_info['positive_reviews'] = None
-            return game_info
-        
-        total_reviews_span = reviews_div.find('span', class_='user_reviews_count')
-        total_reviews = int(total_reviews_span.text[1:-1].replace(',', ''))
-        game_info['total_reviews'] = total_reviews
-
-        positive_reviews_span = total_reviews_span.find_next('span', class_='user_reviews_count')
-        positive_reviews = int(positive_reviews_span.text[1:-1].replace(',', ''))
-        game_info['positive_reviews'] = positive_reviews
-        return game_info
-    
-    def get_game_info(self, search_page: str, game_page: str, appid: int) -> dict:
-        game_info_main = self._get_game_info_main(search_page, appid)
-        game_info_detail = self._get_game_info_detail(game_page)
+    async def get_game_info(self, game_info_main: dict, appid: int) -> dict | None:
+        # one bad game page skips that game, it does not end the crawl
+        try:
+            game_info_detail = await self.fetch_game_info_detail(game_info_main['link'])
+        except (AttributeError, ValueError, IndexError, FetchError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error on game {game_info_main['title']}: {e!r}")
+            game_info_detail = None
+        finally:
+            self.games_processed += 1
+        if game_info_detail is None:
+            print(f"Failed to fetch game info for game {game_info_main['title']}")
+            return None
         return {**game_info_main, **game_info_detail, "steam_id": appid}
     
     async def get_games_info(self, i: int) -> list[dict]:
         scroll_page = await self.fetch_scroll_page(i)
-        game_urls = self.get_game_urls(scroll_page)
-        game_ids = self.get_game_ids(game_urls)
-        game_pages = await self.fetch_game_pages(game_urls)
+        games_info_main = await self._parse(get_games_info_main, scroll_page)
+        self.listed_steam_ids.update(games_info_main)
+        games_info_main = {game_id: game_info_main for game_id, game_info_main in games_info_main.items()
+                           if game_info_main is not None}
+        if self.prices_only:
+            self.games_processed += len(games_info_main)
+            return [{**game_info_main, "steam_id": game_id, "page": i} for game_id, game_info_main in games_info_main.items()]
+        tasks = [self.get_game_info(game_info_main, game_id) for game_id, game_info_main in games_info_main.items()]
         games_info = []
-        for game_id, game_page, game_url in zip(game_ids, game_pages, game_urls):
-            try:
-                game_info = self.get_game_info(scroll_page, game_page, game_id)
-                game_info['link'] = game_url.split('?')[0]
+        for game_info in await asyncio.gather(*tasks):
+            if game_info is not None:
+                game_info['page'] = i
                 games_info.append(game_info)
-            except AttributeError as e:
-                print(f"Failed to fetch game info for game {game_info['title']}")
-            finally:
-                self.games_processed += 1
         return games_info
 
-    async def run(self):
-        sub_content = await self._fetch_url_content(self.scroll_url.replace("NUM", "0"))
-        sub_content = json.loads(sub_content)
-        if not sub_content["success"]:
-            raise Exception("Failed to start a crawler")
-        self.total_games = sub_content["total_count"]
-        for i in range(0, self.total_games // 50 + 1):
+    async def _scroll_page_worker(self, pages) -> None:
+        # workers share one page iterator, so at most max_scroll_pages pages are in flight
+        for i in pages:
             games_info = await self.get_games_info(i)
-            self.datastream.extend(games_info)
+            for game_info in games_info:
+                await self.datastream.put(game_info)
+
+    async def stream(self):
+        # yields crawled games until run() signals the end of the crawl with None
+        while True:
+            game_info = await self.datastream.get()
+            if game_info is None:
+                return
+            yield game_info
+
+    async def run(self):
+        self.session = self._create_session()
+        self._set_agecheck_cookies()
+        if self.parse_workers != 0:
+            self.parse_executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+        cancelled = False
+        try:
+            sub_content = await self._fetch_url_content(self.scroll_url.replace("NUM", "0"))
+            sub_content = json.loads(sub_content)
+            if not sub_content["success"]:
+                raise Exception("Failed to start a crawler")
+            self.total_games = sub_content["total_count"]
+            pages = iter(range(0, self.total_games // 50 + 1))
+            workers = [asyncio.create_task(self._scroll_page_worker(pages)) for _ in range(self.max_scroll_pages)]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                # a failed worker leaves the others running, they must stop before the session and executor close
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            await self.session.close()
+            self.session = None
+            if self.parse_executor is not None:
+                self.parse_executor.shutdown()
+                self.parse_executor = None
+            # cancelled by the consumer, nobody waits for the end of the stream and a full queue would block
+            if not cancelled:
+                await self.datastream.put(None)
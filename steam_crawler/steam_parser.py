@@ -0,0 +1,122 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Parsers are plain module-level functions (raw HTML in, plain dicts out)
+# so SteamCrawler can run them in a process pool.
+
+
+def _is_detail_region(name: str, attrs: dict) -> bool:
+    # only the blocks get_game_info_detail reads; everything else on the page is skipped
+    if name != 'div':
+        return False
+    classes = attrs.get('class') or ''
+    if isinstance(classes, str):
+        classes = classes.split()
+    return ('glance_ctn' in classes or 'age_gate' in classes
+            or attrs.get('id') in ('genresAndManufacturer', 'reviews_filter_options'))
+
+
+DETAIL_REGIONS = SoupStrainer(_is_detail_region)
+
+# backend name -> (BeautifulSoup tree builder, parse_only strainer)
+DETAIL_PARSERS = {
+    'full': ('html.parser', None),
+    'strained': ('html.parser', DETAIL_REGIONS),
+    'lxml': ('lxml', DETAIL_REGIONS),
+}
+
+def get_game_urls(page: str) -> list[str]:
+    soup = BeautifulSoup(page, 'html.parser')
+    links = soup.select("a.search_result_row")
+    return [link['href'] for link in links if 'href' in link.attrs]
+
+
+def _get_game_info_main(a_tag) -> dict:
+    game_info = {}
+    game_info['link'] = a_tag['href'].split('?')[0]
+    title_span = a_tag.find('span', class_='title')
+    game_info['title'] = title_span.text
+    win_span = a_tag.find('span', class_='platform_img win')
+    mac_span = a_tag.find('span', class_='platform_img mac')
+    linux_span = a_tag.find('span', class_='platform_img linux')
+    game_info['supports_win'] = bool(win_span)
+    game_info['supports_mac'] = bool(mac_span)
+    game_info['supports_linux'] = bool(linux_span)
+    original_price_div = a_tag.find('div', class_='discount_original_price')
+    discount_price_div = a_tag.find('div', class_='discount_final_price')
+    if original_price_div:
+        price_wo_discount = float(original_price_div.text[:-1].replace(',', '.')) if original_price_div.text != 'Free' else 0
+        price_w_discount = float(discount_price_div.text[:-1].replace(',', '.')) if discount_price_div.text != 'Free' else 0
+        game_info['price_wo_discount'] = price_wo_discount
+        game_info['price_w_discount'] = price_w_discount
+    else:
+        price_w_discount = float(discount_price_div.text[:-1].replace(',', '.')) if discount_price_div.text != 'Free' else 0
+        game_info['price_wo_discount'] = price_w_discount
+        game_info['price_w_discount'] = price_w_discount
+    return game_info
+
+
+def get_games_info_main(page: str) -> dict[int, dict | None]:
+    # parses the scroll page once and indexes every app row by its appid,
+    # None for rows that are listed but could not be parsed
+    soup = BeautifulSoup(page, 'html.parser')
+    games_info = {}
+    for a_tag in soup.select("a.search_result_row"):
+        item_key = a_tag.get('data-ds-itemkey', '')
+        if not item_key.startswith('App_') or 'href' not in a_tag.attrs:
+            continue
+        try:
+            appid = int(item_key[len('App_'):])
+        except ValueError:
+            continue
+        try:
+            games_info[appid] = _get_game_info_main(a_tag)
+        except (AttributeError, ValueError):
+            print(f"Failed to fetch game info for game {appid}")
+            games_info[appid] = None
+    return games_info
+
+
+def get_game_info_detail(page: str, backend: str = 'full') -> dict | None:
+    # returns None if the page is an age gate instead of the game page
+    features, parse_only = DETAIL_PARSERS[backend]
+    soup = BeautifulSoup(page, features, parse_only=parse_only)
+    if soup.find("div", {"class": "age_gate"}):
+        return None
+    game_info = {}
+    glance_block = soup.find('div', class_='glance_ctn')
+    release_date = glance_block.find('div', class_='date')
+    game_info['release_date'] = release_date.text if release_date else None
+
+    # publishers are the second dev_row of glance_ctn, never one further down the page (which only
+    # the 'full' backend would see), so every backend reads the same rows
+    dev_rows = glance_block.find_all('div', class_='dev_row', limit=2)
+    developers_list_div = dev_rows[0] if dev_rows else None
+    developers = [developer.text for developer in developers_list_div.find_all('a')] if developers_list_div else []
+    game_info['developers'] = developers
+
+    publishers_list_div = dev_rows[1] if len(dev_rows) > 1 else None
+    publishers = [publisher.text for publisher in publishers_list_div.find_all('a')] if publishers_list_div else []
+    game_info['publishers'] = publishers
+
+    tags_div = glance_block.find('div', class_='glance_tags_ctn')
+    tags = [tag.text.strip() for tag in tags_div.find_all('a')] if tags_div else []
+    game_info['tags'] = tags
+
+    genres_block = soup.find('div', id='genresAndManufacturer').find('span')
+    genres = [genre.text for genre in genres_block.find_all('a')] if genres_block else []
+    game_info['genres'] = genres
+
+    reviews_div = soup.find('div', id='reviews_filter_options')
+    if not reviews_div:
+        game_info['total_reviews'] = None
+        game_info['positive_reviews'] = None
+        return game_info
+
+    total_reviews_span = reviews_div.find('span', class_='user_reviews_count')
+    total_reviews = int(total_reviews_span.text[1:-1].replace(',', ''))
+    game_info['total_reviews'] = total_reviews
+
+    positive_reviews_span = total_reviews_span.find_next('span', class_='user_reviews_count')
+    positive_reviews = int(positive_reviews_span.text[1:-1].replace(',', ''))
+    game_info['positive_reviews'] = positive_reviews
+    return game_info
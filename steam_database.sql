@@ -29,7 +29,8 @@ CREATE TABLE games (
     supports_linux BOOL,
     supports_mac BOOL,
     positive_reviews INT,
-    total_reviews INT
+    total_reviews INT,
+    score DOUBLE PRECISION GENERATED ALWAYS AS (positive_reviews::float / NULLIF(total_reviews, 0) * 100) STORED
 );
 
 CREATE INDEX idx_title ON games(title);
@@ -87,5 +88,95 @@ CREATE TABLE price_history (
     FOREIGN KEY (game_id) REFERENCES games(game_id)
 );
 
-CREATE INDEX idx_game_id ON price_history(game_id);
+CREATE INDEX idx_price_history_game_id_date_time ON price_history(game_id, date_time);
 CREATE INDEX idx_date_time ON price_history(date_time);
+
+-- Latest price_history row per game, kept up to date by the crawler writer
+CREATE TABLE current_prices (
+    game_id INT PRIMARY KEY,
+    price_wo_discount DECIMAL(10, 2),
+    price_w_discount DECIMAL(10, 2),
+    date_time TIMESTAMP,
+    FOREIGN KEY (game_id) REFERENCES games(game_id)
+);
+
+-- Single row bumped by run_crawler.py at the end of each crawl, API caches are dropped when it changes
+CREATE TABLE data_version (
+    version INT NOT NULL,
+    updated_at TIMESTAMP NOT NULL
+);
+
+INSERT INTO data_version (version, updated_at) VALUES (1, NOW());
+
+-- One row per game with its dimension names and current price, read by the API instead of
+-- joining all link tables per request. Refreshed by run_crawler.py at the end of each crawl.
+CREATE MATERIALIZED VIEW game_search AS
+SELECT
+    g.game_id,
+    g.steam_id,
+    g.title,
+    g.link,
+    g.available,
+    g.release_date,
+    g.supports_win,
+    g.supports_linux,
+    g.supports_mac,
+    g.positive_reviews,
+    g.total_reviews,
+    g.score,
+    ARRAY(
+        SELECT gnr.genre_name
+        FROM game_genres gg
+        JOIN genres gnr ON gg.genre_id = gnr.genre_id
+        WHERE gg.game_id = g.game_id
+        ORDER BY gnr.genre_name
+    ) AS genres,
+    ARRAY(
+        SELECT tg.tag_name
+        FROM game_tags gt
+        JOIN tags tg ON gt.tag_id = tg.tag_id
+        WHERE gt.game_id = g.game_id
+        ORDER BY tg.tag_name
+    ) AS tags,
+    ARRAY(
+        SELECT dev.developer_name
+        FROM game_developers gd
+        JOIN developers dev ON gd.developer_id = dev.developer_id
+        WHERE gd.game_id = g.game_id
+        ORDER BY dev.developer_name
+    ) AS developers,
+    ARRAY(
+        SELECT pub.publisher_name
+        FROM game_publishers gp
+        JOIN publishers pub ON gp.publisher_id = pub.publisher_id
+        WHERE gp.game_id = g.game_id
+        ORDER BY pub.publisher_name
+    ) AS publishers,
+    cp.price_w_discount AS last_price
+FROM games g
+LEFT JOIN current_prices cp ON g.game_id = cp.game_id;
+
+-- unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX idx_game_search_game_id ON game_search(game_id);
+CREATE UNIQUE INDEX idx_game_search_steam_id ON game_search(steam_id);
+
+-- Sort indexes for keyset pagination in search_games, one per sort column and direction
+-- (ORDER BY <column> <direction> NULLS LAST, steam_id <direction>)
+CREATE INDEX idx_game_search_score_asc ON game_search(score, steam_id);
+CREATE INDEX idx_game_search_score_desc ON game_search(score DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_last_price_asc ON game_search(last_price, steam_id);
+CREATE INDEX idx_game_search_last_price_desc ON game_search(last_price DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_release_date_asc ON game_search(release_date, steam_id);
+CREATE INDEX idx_game_search_release_date_desc ON game_search(release_date DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_title_asc ON game_search(title, steam_id);
+CREATE INDEX idx_game_search_title_desc ON game_search(title DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_total_reviews_asc ON game_search(total_reviews, steam_id);
+CREATE INDEX idx_game_search_total_reviews_desc ON game_search(total_reviews DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_positive_reviews_asc ON game_search(positive_reviews, steam_id);
+CREATE INDEX idx_game_search_positive_reviews_desc ON game_search(positive_reviews DESC NULLS LAST, steam_id DESC);
+CREATE INDEX idx_game_search_steam_id_desc ON game_search(steam_id DESC NULLS LAST);
+
+-- Trigram index so the title ILIKE '%...%' filter and relevance ranking in search_games
+-- no longer scan every row of game_search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX idx_game_search_title_trgm ON game_search USING gin (title gin_trgm_ops);
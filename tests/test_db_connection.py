@@ -0,0 +1,80 @@
+import base64
+import json
+from datetime import date
+from decimal import Decimal
+import pytest
+from db_connection import SEARCH_SORT_COLUMNS, encode_search_cursor, decode_search_cursor
+
+GAME_INFO = {
+    'steam_id': 570,
+    'score': 81.5,
+    'last_price': Decimal('19.99'),
+    'release_date': date(2013, 7, 9),
+    'title': 'Dota 2',
+    'total_reviews': 2000000,
+    'positive_reviews': 1630000,
+    'relevance': 0.75
+}
+
+
+def token(cursor: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+@pytest.mark.parametrize('sort', SEARCH_SORT_COLUMNS)
+@pytest.mark.parametrize('sort_direction', ['ASC', 'desc'])
+def test_round_trip(sort, sort_direction):
+    value, steam_id = decode_search_cursor(encode_search_cursor(sort, sort_direction, GAME_INFO), sort, sort_direction)
+    assert steam_id == 570
+    assert value == json.loads(json.dumps(GAME_INFO[sort], default=str))
+
+
+@pytest.mark.parametrize('sort', SEARCH_SORT_COLUMNS)
+def test_null_sort_value(sort):
+    cursor = encode_search_cursor(sort, 'DESC', {**GAME_INFO, sort: None} if sort != 'steam_id' else GAME_INFO)
+    assert decode_search_cursor(cursor, sort, 'DESC')[1] == 570
+
+
+@pytest.mark.parametrize('cursor', ['', 'not base64!', token({'sort': 'score'}), token(['score', 'DESC', 1]), token(5)])
+def test_malformed(cursor):
+    with pytest.raises(ValueError, match="Malformed cursor"):
+        decode_search_cursor(cursor, 'score', 'DESC')
+
+
+def test_different_sort_order():
+    cursor = encode_search_cursor('score', 'DESC', GAME_INFO)
+    with pytest.raises(ValueError, match="different sort order"):
+        decode_search_cursor(cursor, 'score', 'ASC')
+    with pytest.raises(ValueError, match="different sort order"):
+        decode_search_cursor(cursor, 'title', 'DESC')
+
+
+@pytest.mark.parametrize('sort, value, steam_id', [
+    ('score', 'xx', 1),
+    ('score', True, 1),
+    ('score', 10 ** 400, 1),
+    ('total_reviews', [1], 1),
+    ('relevance', {}, 1),
+    ('last_price', 'abc', 1),
+    ('last_price', 'NaN', 1),
+    ('last_price', '1e999999', 1),
+    ('last_price', '100000000', 1),
+    ('last_price', 1e300, 1),
+    ('release_date', 'yesterday', 1),
+    ('release_date', 20150101, 1),
+    ('title', 5, 1),
+    ('score', 50, '1'),
+    ('score', 50, 1.5),
+    ('score', 50, True),
+    ('score', 50, 10 ** 400),
+    ('score', 50, 2 ** 31),
+])
+def test_wrong_value_type(sort, value, steam_id):
+    # values encode_search_cursor never writes would fail in SQL or in the search engine
+    with pytest.raises(ValueError, match="Malformed cursor"):
+        decode_search_cursor(token([sort, 'DESC', value, steam_id]), sort, 'DESC')
+
+
+def test_last_price_bounds():
+    assert decode_search_cursor(token(['last_price', 'ASC', '99999999.99', 1]), 'last_price', 'ASC')[0] == '99999999.99'
+    assert decode_search_cursor(token(['last_price', 'ASC', 0, 1]), 'last_price', 'ASC')[0] == 0
@@ -0,0 +1,46 @@
+from response_cache import ResponseCache
+
+
+def test_hit_after_set():
+    response_cache = ResponseCache()
+    response_cache.sync_version(1)
+    response_cache.set('key', 'value', 1)
+    assert response_cache.get('key') == 'value'
+
+
+def test_version_bump_clears():
+    response_cache = ResponseCache()
+    response_cache.sync_version(1)
+    response_cache.set('key', 'value', 1)
+    response_cache.sync_version(2)
+    assert response_cache.get('key') is None
+    assert response_cache.stats()['invalidations'] == 1
+
+
+def test_value_computed_across_a_version_bump_is_dropped():
+    # a request synced version 1 and ran its query, another one synced version 2 in the meantime
+    response_cache = ResponseCache()
+    response_cache.sync_version(1)
+    response_cache.sync_version(2)
+    response_cache.set('key', 'stale', 1)
+    assert response_cache.get('key') is None
+    assert response_cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_is_evicted():
+    response_cache = ResponseCache(max_entries=2)
+    response_cache.sync_version(1)
+    response_cache.set('a', 1, 1)
+    response_cache.set('b', 2, 1)
+    response_cache.get('a')
+    response_cache.set('c', 3, 1)
+    assert response_cache.get('b') is None
+    assert response_cache.get('a') == 1 and response_cache.get('c') == 3
+    assert response_cache.stats()['evictions'] == 1
+
+
+def test_expired_entry_is_a_miss():
+    response_cache = ResponseCache(ttl=0)
+    response_cache.sync_version(1)
+    response_cache.set('key', 'value', 1)
+    assert response_cache.get('key') is None
@@ -0,0 +1,54 @@
+import json
+import psycopg2
+from psycopg2 import sql
+import pytest
+from db_connection import DBConnection
+
+
+@pytest.fixture
+def db_connection():
+    try:
+        db_connection = DBConnection("localhost", 5432, "steam", "twinkboy42", "twinkboy42")
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"database not available: {e}")
+    yield db_connection
+    db_connection.conn.rollback()
+    db_connection.conn.close()
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def explain(db_connection: DBConnection, **search_args) -> list[dict]:
+    final_query, params = db_connection._search_query(**search_args)
+    cursor = db_connection.conn.cursor()
+    try:
+        # a small catalogue would otherwise be read sequentially whatever the predicate looks like
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(sql.SQL("EXPLAIN (FORMAT JSON) ") + final_query, params)
+        plan = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return list(plan_nodes(plan[0]['Plan']))
+
+
+@pytest.mark.parametrize('sort_direction', ['ASC', 'DESC'])
+def test_year_filter_is_an_index_condition(db_connection, sort_direction):
+    # the year range has to reach the release_date index, not be checked row by row
+    nodes = explain(db_connection, min_year=2015, max_year=2016, sort='release_date', sort_direction=sort_direction,
+                    limit=50)
+    index_scans = [node for node in nodes if node.get('Index Name', '').startswith('idx_game_search_release_date')]
+    assert index_scans, nodes
+    assert all('release_date' in node.get('Index Cond', '') for node in index_scans)
+    assert all('release_date' not in node.get('Filter', '') for node in index_scans)
+
+
+def test_default_sort_reads_the_score_index(db_connection):
+    nodes = explain(db_connection, sort='score', sort_direction='DESC', limit=50)
+    assert any(node.get('Index Name') == 'idx_game_search_score_desc' for node in nodes), nodes
+    assert not any(node['Node Type'] == 'Sort' for node in nodes)
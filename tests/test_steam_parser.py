@@ -0,0 +1,83 @@
+from pathlib import Path
+import pytest
+from steam_crawler.steam_parser import DETAIL_PARSERS, get_game_info_detail, get_games_info_main
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def read_fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize('fixture', ['detail.html', 'detail_without_publisher.html', 'age_gate.html'])
+def test_detail_backends_agree(fixture):
+    # the crawler default must not change what lands in the database
+    page = read_fixture(fixture)
+    expected = get_game_info_detail(page, 'full')
+    for backend in DETAIL_PARSERS:
+        assert get_game_info_detail(page, backend) == expected, backend
+
+
+@pytest.mark.parametrize('backend', DETAIL_PARSERS)
+def test_detail(backend):
+    assert get_game_info_detail(read_fixture('detail.html'), backend) == {
+        'release_date': '23 Feb, 2018',
+        'developers': ['Studio A', 'Studio B'],
+        'publishers': ['Pub Co'],
+        'tags': ['Action', 'RPG'],
+        'genres': ['Action', 'Indie'],
+        'total_reviews': 1234,
+        'positive_reviews': 1000
+    }
+
+
+@pytest.mark.parametrize('backend', DETAIL_PARSERS)
+def test_detail_without_publisher(backend):
+    game_info = get_game_info_detail(read_fixture('detail_without_publisher.html'), backend)
+    assert game_info['developers'] == ['Solo Dev']
+    assert game_info['publishers'] == []
+    assert game_info['total_reviews'] is None
+
+
+@pytest.mark.parametrize('backend', DETAIL_PARSERS)
+def test_age_gate(backend):
+    assert get_game_info_detail(read_fixture('age_gate.html'), backend) is None
+
+
+def test_scroll_page_rows_by_appid():
+    games_info = get_games_info_main(read_fixture('scroll_results.html'))
+    assert len(games_info) == 48
+    assert games_info[100000] == {
+        'link': 'https://store.steampowered.com/app/100000/Counter-Strike_2/',
+        'title': 'Counter-Strike 2',
+        'supports_win': True,
+        'supports_mac': True,
+        'supports_linux': True,
+        'price_wo_discount': 59.99,
+        'price_w_discount': 29.99
+    }
+    # without a discount both prices are the final one
+    assert (games_info[100020]['price_wo_discount'], games_info[100020]['price_w_discount']) == (49.99, 49.99)
+    assert games_info[100020]['title'] == "Baldur's Gate 3"
+
+
+def test_scroll_page_free_game():
+    game_info = get_games_info_main(read_fixture('scroll_results.html'))[100010]
+    assert game_info['title'] == 'Dota 2'
+    assert (game_info['price_wo_discount'], game_info['price_w_discount']) == (0, 0)
+
+
+def test_scroll_page_skips_bundles_and_subs():
+    games_info = get_games_info_main(read_fixture('scroll_results.html'))
+    # their data-ds-appid values, only App_ rows are games
+    assert 1086940 not in games_info and 553850 not in games_info
+    assert not any('Bundle' in game_info['title'] or 'Edition' in game_info['title']
+                   for game_info in games_info.values() if game_info is not None)
+
+
+def test_scroll_page_malformed_rows():
+    # still listed, so the crawler does not take them for games that left the store
+    games_info = get_games_info_main(read_fixture('scroll_results.html'))
+    assert games_info[100090] is None
+    assert games_info[100100] is None
+    assert sum(game_info is None for game_info in games_info.values()) == 2